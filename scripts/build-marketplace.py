@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Build the marketplace in one pass: fetch every plugin once, validate it,
+and emit both the validation report and CATALOG.md from the same manifests.
+
+Usage:
+  python scripts/build-marketplace.py                # Validate + generate CATALOG.md
+  python scripts/build-marketplace.py --check        # Validate + check CATALOG.md is up to date (CI mode)
+  python scripts/build-marketplace.py --jobs auto    # Validate plugins concurrently
+  python scripts/build-marketplace.py --check --changed-since origin/main  # PR mode: changed entries only
+
+Exit codes:
+- 0: All plugins pass validation and CATALOG.md is written / up to date
+- 1: Validation failed or CATALOG.md is out of date
+"""
+import argparse
+import sys
+from importlib import import_module
+from pathlib import Path
+from typing import List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent))
+validator = import_module("validate-plugins")
+catalog = import_module("generate-catalog")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Validate marketplace plugins and generate CATALOG.md")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Check that CATALOG.md is up to date instead of writing it"
+    )
+    parser.add_argument(
+        "--changed-since",
+        metavar="GIT_REF",
+        help="Fully validate only entries added or modified since GIT_REF, and take the "
+             "CATALOG.md sections of the rest as they are"
+    )
+    validator.add_validation_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    marketplace = validator.load_marketplace()
+
+    schema_errors = validator.validate_marketplace_schema(marketplace)
+    if schema_errors:
+        print("❌ Marketplace schema invalid:")
+        for e in schema_errors:
+            print(f"  - {e}")
+        return 1
+
+    plugins = marketplace.get("plugins", [])
+
+    only = None
+    if args.changed_since:
+        base_plugins, error = validator.load_base_plugins(args.changed_since)
+        if base_plugins is None:
+            validator.fail(error)
+        only = validator.changed_entry_indices(plugins, base_plugins)
+        print(f"🔍 {len(only)} of {len(plugins)} entries changed since {args.changed_since}\n")
+
+    results = []
+    report_code = 0
+    if plugins:
+        try:
+            jobs = validator.resolve_jobs(args.jobs, len(plugins) if only is None else max(1, len(only)))
+            scan_workers = validator.resolve_scan_workers(args.scan_workers)
+            prefetch = validator.resolve_prefetch(args.prefetch, jobs)
+            budget = validator.resolve_budget(args.plugin_timeout, args.plugin_cpu, args.plugin_memory)
+            validator.configure_subprocess_timeout(validator.resolve_subprocess_timeout(args.subprocess_timeout))
+        except ValueError as e:
+            validator.fail(str(e))
+
+        validator.ensure_tmp()
+        try:
+            results, all_command_index = validator.validate_all(
+                plugins, jobs, use_cache=not args.no_cache, only=only,
+                scan_workers=scan_workers, prefetch=prefetch, fail_fast=args.fail_fast,
+                budget=budget
+            )
+        finally:
+            validator.cleanup_tmp()
+
+        report_code = validator.print_report(results, all_command_index)
+    else:
+        print("✅ Marketplace validated (no plugins to check)")
+
+    infos = [
+        catalog.plugin_info_from_manifest(plugin, result.manifest)
+        for plugin, result in zip(plugins, results)
+    ]
+    content = catalog.generate_catalog(infos, marketplace)
+    if only is not None:
+        # Unchanged entries were not fetched: their sections stand as written
+        existing = catalog.CATALOG_FILE.read_text(encoding="utf-8") if catalog.CATALOG_FILE.exists() else ""
+        unchanged = {plugin.get("name", "unknown") for idx, plugin in enumerate(plugins) if idx not in only}
+        content = catalog.keep_sections(content, existing, unchanged)
+    catalog_code = catalog.write_or_check_catalog(content, args.check)
+
+    return report_code or catalog_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,12 +9,16 @@ Usage:
 import json
 import os
 import shutil
-import subprocess
 import sys
 from dataclasses import dataclass
 from datetime import datetime
+from importlib import import_module
 from pathlib import Path
-from typing import Dict, List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
+
+# Share the validator's mirror cache so plugin repos are fetched incrementally
+sys.path.insert(0, str(Path(__file__).parent))
+validator = import_module("validate-plugins")
 
 ROOT = Path(__file__).resolve().parents[1]
 MARKETPLACE_FILE = ROOT / ".claude-plugin" / "marketplace.json"
@@ -41,16 +45,11 @@ class PluginInfo:
     risk_notes: Optional[str] = None
 
 
-def run(cmd: List[str], cwd: Optional[Path] = None) -> tuple:
-    p = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True)
-    return p.returncode, (p.stdout or "") + (p.stderr or "")
-
-
 def clone_repo(url: str, dest: Path) -> bool:
     if dest.exists():
         shutil.rmtree(dest)
-    code, _ = run(["git", "clone", "--depth", "1", url, str(dest)])
-    return code == 0
+    success, _ = validator.clone_repo(url, dest)
+    return success
 
 
 def load_marketplace() -> dict:
@@ -66,8 +65,8 @@ def find_manifest(repo_path: Path) -> Optional[Path]:
     return None
 
 
-def extract_plugin_info(plugin: dict, repo_path: Optional[Path]) -> PluginInfo:
-    """Extract plugin info from marketplace entry and manifest."""
+def plugin_info_from_manifest(plugin: dict, manifest: Optional[dict]) -> PluginInfo:
+    """Build plugin info from a marketplace entry and an already-parsed manifest."""
 
     # Basic info from marketplace entry
     tier = plugin.get("tier") or plugin.get("category", "unknown")
@@ -82,45 +81,58 @@ def extract_plugin_info(plugin: dict, repo_path: Optional[Path]) -> PluginInfo:
         tags=plugin.get("tags", []),
     )
 
-    # Try to read manifest from cloned repo
-    if repo_path:
-        manifest_path = find_manifest(repo_path)
-        if manifest_path:
-            try:
-                manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    if manifest is None:
+        return info
 
-                info.version = manifest.get("version")
+    try:
+        info.version = manifest.get("version")
+
+        caps = manifest.get("capabilities", {})
+
+        # Network
+        network = caps.get("network", {})
+        info.network_mode = network.get("mode", "none")
+        info.network_domains = network.get("domains", [])
+
+        # Filesystem
+        fs = caps.get("filesystem", {})
+        info.fs_read = fs.get("read", [])
+        info.fs_write = fs.get("write", [])
+
+        # Commands
+        cmds = caps.get("commands", {})
+        info.commands_allow = cmds.get("allow", [])
+        info.commands_deny = cmds.get("deny", [])
 
-                caps = manifest.get("capabilities", {})
+        # Secrets
+        secrets = caps.get("secrets", {})
+        info.secrets_required = secrets.get("required", [])
 
-                # Network
-                network = caps.get("network", {})
-                info.network_mode = network.get("mode", "none")
-                info.network_domains = network.get("domains", [])
+        # Risk
+        risk = manifest.get("risk", {})
+        info.risk_egress = risk.get("dataEgress")
+        info.risk_notes = risk.get("notes")
 
-                # Filesystem
-                fs = caps.get("filesystem", {})
-                info.fs_read = fs.get("read", [])
-                info.fs_write = fs.get("write", [])
+    except Exception as e:
+        print(f"  Warning: Could not read manifest: {e}")
 
-                # Commands
-                cmds = caps.get("commands", {})
-                info.commands_allow = cmds.get("allow", [])
-                info.commands_deny = cmds.get("deny", [])
+    return info
 
-                # Secrets
-                secrets = caps.get("secrets", {})
-                info.secrets_required = secrets.get("required", [])
 
-                # Risk
-                risk = manifest.get("risk", {})
-                info.risk_egress = risk.get("dataEgress")
-                info.risk_notes = risk.get("notes")
+def extract_plugin_info(plugin: dict, repo_path: Optional[Path]) -> PluginInfo:
+    """Extract plugin info from marketplace entry and manifest."""
+    manifest = None
 
+    # Try to read manifest from cloned repo
+    if repo_path:
+        manifest_path = find_manifest(repo_path)
+        if manifest_path:
+            try:
+                manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
             except Exception as e:
                 print(f"  Warning: Could not read manifest: {e}")
 
-    return info
+    return plugin_info_from_manifest(plugin, manifest)
 
 
 def network_badge(info: PluginInfo) -> str:
@@ -276,6 +288,67 @@ def generate_catalog(plugins: List[PluginInfo], marketplace: dict) -> str:
     return "\n".join(lines)
 
 
+def strip_timestamp(s: str) -> str:
+    lines = s.split("\n")
+    return "\n".join(l for l in lines if not l.startswith("**Generated:**"))
+
+
+def catalog_sections(lines: List[str]) -> Dict[str, Tuple[int, int]]:
+    """Line span of each plugin's "### name" section, up to the next heading or rule."""
+    spans: Dict[str, Tuple[int, int]] = {}
+    name, start = None, 0
+    for i, line in enumerate(lines + ["---"]):
+        if line.startswith(("### ", "## ", "---")):
+            if name is not None:
+                spans[name] = (start, i)
+            name = line[4:] if line.startswith("### ") else None
+            start = i
+    return spans
+
+
+def keep_sections(content: str, existing: str, names: Set[str]) -> str:
+    """
+    Catalog content with the sections of the named plugins as they read in
+    existing, for a catalog built from the manifests of some plugins only.
+    Sections existing lacks are left as generated.
+    """
+    lines = content.split("\n")
+    old_lines = existing.split("\n")
+    old = catalog_sections(old_lines)
+    out: List[str] = []
+    pos = 0
+    for name, (start, end) in sorted(catalog_sections(lines).items(), key=lambda item: item[1]):
+        if name in names and name in old:
+            old_start, old_end = old[name]
+            out.extend(lines[pos:start])
+            out.extend(old_lines[old_start:old_end])
+            pos = end
+    out.extend(lines[pos:])
+    return "\n".join(out)
+
+
+def write_or_check_catalog(content: str, check_mode: bool) -> int:
+    """Write CATALOG.md, or in check mode compare it with content. Returns exit code."""
+    if check_mode:
+        # Check if existing catalog matches
+        if CATALOG_FILE.exists():
+            existing = CATALOG_FILE.read_text(encoding="utf-8")
+            # Compare ignoring the "Generated:" timestamp line
+            if strip_timestamp(existing) != strip_timestamp(content):
+                print("❌ CATALOG.md is out of date. Run: python scripts/generate-catalog.py")
+                return 1
+            else:
+                print("✅ CATALOG.md is up to date")
+                return 0
+        else:
+            print("❌ CATALOG.md does not exist. Run: python scripts/generate-catalog.py")
+            return 1
+    else:
+        CATALOG_FILE.write_text(content, encoding="utf-8")
+        print(f"\n✅ Generated {CATALOG_FILE}")
+        return 0
+
+
 def main():
     check_mode = "--check" in sys.argv
 
@@ -318,29 +391,7 @@ def main():
             plugins.append(info)
 
         content = generate_catalog(plugins, marketplace)
-
-        if check_mode:
-            # Check if existing catalog matches
-            if CATALOG_FILE.exists():
-                existing = CATALOG_FILE.read_text(encoding="utf-8")
-                # Compare ignoring the "Generated:" timestamp line
-                def strip_timestamp(s):
-                    lines = s.split("\n")
-                    return "\n".join(l for l in lines if not l.startswith("**Generated:**"))
-
-                if strip_timestamp(existing) != strip_timestamp(content):
-                    print("❌ CATALOG.md is out of date. Run: python scripts/generate-catalog.py")
-                    return 1
-                else:
-                    print("✅ CATALOG.md is up to date")
-                    return 0
-            else:
-                print("❌ CATALOG.md does not exist. Run: python scripts/generate-catalog.py")
-                return 1
-        else:
-            CATALOG_FILE.write_text(content, encoding="utf-8")
-            print(f"\n✅ Generated {CATALOG_FILE}")
-            return 0
+        return write_or_check_catalog(content, check_mode)
 
     finally:
         if TMP_DIR.exists():
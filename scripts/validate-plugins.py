@@ -13,20 +13,56 @@ Exit codes:
 - 0: All plugins pass validation
 - 1: One or more plugins failed validation
 """
+import argparse
+import asyncio
+import hashlib
 import json
+import math
+import mmap
+import multiprocessing
+import multiprocessing.connection
 import os
 import re
 import shutil
+import signal
+import stat
+import string
+import struct
 import subprocess
 import sys
-from dataclasses import dataclass, field
+import threading
+import time
+from bisect import bisect_right
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field, replace
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional, Set, Any
+from typing import Dict, List, Tuple, Optional, Set, Any, Union
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_constants
+    import sre_parse
+
+try:
+    import resource
+except ImportError:  # Windows: no CPU-time or address-space limits
+    resource = None
 
 ROOT = Path(__file__).resolve().parents[1]
 MARKETPLACE_FILE = ROOT / ".claude-plugin" / "marketplace.json"
 SCHEMA_DIR = ROOT / "schema"
 TMP_DIR = ROOT / ".tmp_plugin_validation"
+CACHE_DIR = ROOT / ".plugin_cache"
+MIRRORS_DIR = CACHE_DIR / "mirrors"
+RESULTS_DIR = CACHE_DIR / "results"
+SCAN_STATE_DIR = CACHE_DIR / "scan-state"
+BLOB_CACHE_DIR = CACHE_DIR / "blobs"
+LEAKED_FILTER_DIR = CACHE_DIR / "leaked-credentials"
+TIMINGS_FILE = CACHE_DIR / "timings.json"
+LEAKED_CREDENTIALS_FILE = ROOT / "security" / "leaked-credentials.txt"
 
 # =========================
 # TUNABLE POLICY SETTINGS
@@ -54,6 +90,25 @@ DISALLOWED_EXTENSIONS = {
     ".wasm",
 }
 
+# Leading bytes of executables, archives and media, flagged whatever the file is named
+MAGIC_NUMBERS = [
+    (b"\x7fELF", "ELF executable"),
+    (b"\xfe\xed\xfa\xce", "Mach-O executable"),
+    (b"\xfe\xed\xfa\xcf", "Mach-O executable"),
+    (b"\xce\xfa\xed\xfe", "Mach-O executable"),
+    (b"\xcf\xfa\xed\xfe", "Mach-O executable"),
+    (b"\xca\xfe\xba\xbe", "Mach-O universal binary or Java class"),
+    (b"\x00asm", "WebAssembly module"),
+    (b"PK\x03\x04", "zip archive"),
+    (b"PK\x05\x06", "zip archive"),
+    (b"PK\x07\x08", "zip archive"),
+    (b"\x1f\x8b", "gzip archive"),
+    (b"\xfd7zXZ\x00", "xz archive"),
+    (b"\x89PNG\r\n\x1a\n", "PNG image"),
+    (b"\xff\xd8\xff", "JPEG image"),
+    (b"%PDF-", "PDF document"),
+]
+
 # Allowed large-ish text formats (still size-limited above)
 TEXT_EXTENSIONS = {
     ".md", ".txt", ".json", ".yml", ".yaml", ".toml",
@@ -102,9 +157,42 @@ SECRET_PATTERNS = [
     (r"(?i)secret\s*[=:]\s*['\"][a-zA-Z0-9_\-]{16,}['\"]", "Secret assignment"),
 ]
 
-# Network/telemetry patterns - code libraries
-NETWORK_CODE_PATTERNS = [
-    # Python
+# Secret-shaped tokens: whole runs of these characters, checked against the
+# leaked credential blocklist and scored for entropy
+SECRET_TOKEN_CHARS = string.ascii_letters + string.digits + "+/_-"
+LEAKED_MIN_LENGTH = 16
+LEAKED_FALSE_POSITIVE_RATE = 1e-4  # Bloom filter hits needing an exact lookup
+
+# High-entropy strings: random-looking base64/hex tokens without a known prefix.
+# Parts of URLs are not candidates.
+ENTROPY_MIN_LENGTH = 20
+ENTROPY_MAX_LENGTH = 200  # longer runs are embedded data (images, bundles), not credentials
+# Entropy as a fraction of the most a token of its length and alphabet can have,
+# at or above which it is reported, per tier and alphabet
+ENTROPY_THRESHOLDS = {
+    "curated": {"hex": 0.8, "base64": 0.8},
+    "community": {"hex": 0.85, "base64": 0.85},
+}
+# Alphabet listings ("0123456789abcdef") and word-like identifiers look random
+# by character counts alone; a random token rarely has 6 same-case letters in a row
+ENTROPY_SEQUENCES = ("0123", "1234", "abcd", "ABCD")
+ENTROPY_WORD_RE = re.compile(r"[a-z]{6}|[A-Z]{6}")
+# Hex runs of digest lengths are checksums and pinned revisions: MD5, SHA-1 and
+# git commits, SHA-256, SHA-512
+HEX_DIGEST_LENGTHS = {32, 40, 64, 128}
+# Curated plugins are rejected for base64 tokens at least this long; other hex
+# runs and shorter tokens (ids, nonces) are reported as warnings in every tier
+ENTROPY_REJECT_MIN_LENGTH = 32
+# Lockfiles pin dependencies by digest; their hashes are expected to look random
+LOCKFILE_NAMES = {
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "bun.lock",
+    "poetry.lock", "Pipfile.lock", "uv.lock", "Cargo.lock", "go.sum", "Gemfile.lock", "composer.lock",
+}
+# Subresource-integrity digests, e.g. "sha512-..." in lockfiles and <script> tags
+INTEGRITY_PREFIXES = ("sha1-", "sha256-", "sha384-", "sha512-")
+
+# Network patterns - Python
+PYTHON_NETWORK_PATTERNS = [
     (r"^\s*import\s+requests\b", "requests import"),
     (r"^\s*from\s+requests\s+import", "requests import"),
     (r"^\s*import\s+urllib\.request", "urllib.request import"),
@@ -116,20 +204,25 @@ NETWORK_CODE_PATTERNS = [
     (r"urllib\.request\.(urlopen|Request)", "urllib HTTP call"),
     (r"^\s*import\s+socket\b", "socket import"),
     (r"^\s*from\s+socket\s+import", "socket import"),
-    # JavaScript/TypeScript
+    (r"^\s*import\s+websocket", "websocket import"),
+]
+
+# Network patterns - JavaScript/TypeScript
+JS_NETWORK_PATTERNS = [
     (r"\bfetch\s*\(", "fetch() call"),
     (r"\baxios\s*[\.\(]", "axios call"),
     (r"new\s+XMLHttpRequest", "XMLHttpRequest"),
     (r"\.ajax\s*\(", "jQuery ajax call"),
     (r"require\s*\(\s*['\"]https?['\"]", "Node http/https require"),
     (r"from\s+['\"]node:https?['\"]", "Node http/https import"),
-    # WebSocket
     (r"\bWebSocket\s*\(", "WebSocket connection"),
-    (r"^\s*import\s+websocket", "websocket import"),
 ]
 
-# Shell network commands
-SHELL_NETWORK_PATTERNS = [
+# Network/telemetry patterns - code libraries
+NETWORK_CODE_PATTERNS = PYTHON_NETWORK_PATTERNS + JS_NETWORK_PATTERNS
+
+# Shell network commands (also spawned from any other language)
+SHELL_COMMAND_PATTERNS = [
     (r"\bcurl\s+", "curl command"),
     (r"\bwget\s+", "wget command"),
     (r"\bnc\s+", "netcat (nc) command"),
@@ -138,11 +231,17 @@ SHELL_NETWORK_PATTERNS = [
     (r"\bssh\s+", "ssh command"),
     (r"\bscp\s+", "scp command"),
     (r"\brsync\s+.*:", "rsync remote command"),
+    (r"\btelnet\s+", "telnet command"),
+]
+
+# PowerShell network cmdlets
+POWERSHELL_NETWORK_PATTERNS = [
     (r"Invoke-WebRequest", "PowerShell Invoke-WebRequest"),
     (r"Invoke-RestMethod", "PowerShell Invoke-RestMethod"),
-    (r"\btelnet\s+", "telnet command"),
 ]
 
+SHELL_NETWORK_PATTERNS = SHELL_COMMAND_PATTERNS + POWERSHELL_NETWORK_PATTERNS
+
 # Telemetry/analytics patterns (always blocked)
 TELEMETRY_PATTERNS = [
     (r"https?://[^'\"\s]*(?:posthog|segment|amplitude|mixpanel)[^'\"\s]*", "Analytics service URL"),
@@ -156,13 +255,74 @@ TELEMETRY_PATTERNS = [
 # Combined network patterns for general scanning
 NETWORK_PATTERNS = NETWORK_CODE_PATTERNS + SHELL_NETWORK_PATTERNS + TELEMETRY_PATTERNS
 
+URL_DOMAIN_RE = re.compile(r'https?://([^/\s\'"]+)')
+
+# Network rule groups, in NETWORK_PATTERNS order
+NETWORK_RULE_GROUPS = {
+    "python": PYTHON_NETWORK_PATTERNS,
+    "javascript": JS_NETWORK_PATTERNS,
+    "shell": SHELL_COMMAND_PATTERNS,
+    "powershell": POWERSHELL_NETWORK_PATTERNS,
+}
+
+# Network rule groups relevant to each language; secret and telemetry rules
+# always apply. Shell commands can be spawned from any of them.
+LANGUAGE_RULE_GROUPS = {
+    "python": {"python", "shell"},
+    "javascript": {"javascript", "shell"},
+    "shell": {"shell"},
+    "powershell": {"powershell", "shell"},
+    "ruby": {"shell"},
+    "go": {"shell"},
+    "rust": {"shell"},
+}
+
+LANGUAGE_BY_EXTENSION = {
+    ".py": "python",
+    ".js": "javascript",
+    ".ts": "javascript",
+    ".sh": "shell",
+    ".bash": "shell",
+    ".zsh": "shell",
+    ".ps1": "powershell",
+    ".rb": "ruby",
+    ".go": "go",
+    ".rs": "rust",
+}
+
+# Interpreter names (version suffix stripped) in shebangs of extensionless scripts
+SHEBANG_LANGUAGES = {
+    "python": "python",
+    "node": "javascript",
+    "deno": "javascript",
+    "bun": "javascript",
+    "sh": "shell",
+    "bash": "shell",
+    "zsh": "shell",
+    "dash": "shell",
+    "ksh": "shell",
+    "pwsh": "powershell",
+    "ruby": "ruby",
+}
+
+# Extensionless files in these dirs are scanned when their shebang names a known interpreter
+SHEBANG_DIRS = {"hooks", "commands"}
+
 # Files to scan for security issues
-SCANNABLE_EXTENSIONS = {".py", ".js", ".ts", ".sh", ".bash", ".zsh", ".rb", ".go", ".rs", ".ps1"}
+SCANNABLE_EXTENSIONS = set(LANGUAGE_BY_EXTENSION)
 
 # =========================
 # CVE SCANNING SETTINGS
 # =========================
 
+# Advisories change independently of plugin code, so cached CVE results
+# expire even when the plugin commit is unchanged
+CVE_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# Files read by the CVE scanners; the only files written to disk when
+# validating straight from the git object database
+DEPENDENCY_FILES = ["requirements.txt", "requirements-dev.txt", "pyproject.toml", "package.json", "package-lock.json"]
+
 # CVE severity thresholds by tier
 # CRITICAL/HIGH = error (fail), MEDIUM = warning, LOW = info
 CVE_POLICY = {
@@ -190,12 +350,119 @@ class PluginResult:
     warnings: List[str] = field(default_factory=list)
     network_detected: bool = False
     detected_domains: Set[str] = field(default_factory=set)
+    commit: Optional[str] = None
+    manifest: Optional[dict] = None
+    entry_only: bool = False  # Unchanged in a --changed-since run: entry checks only
+    timings: Dict[str, float] = field(default_factory=dict, compare=False)  # seconds per phase: clone, walk, scan, cve
+
 
+@dataclass
+class RepoFile:
+    """A plugin file, from a working tree inventory or a git tree listing."""
+    path: str                   # POSIX path relative to the repo root
+    size: int = 0
+    is_symlink: bool = False
+    oid: Optional[str] = None   # blob id when listed from a git tree
+    mode: int = 0               # st_mode, or the git tree entry mode
+    ext: str = field(init=False)                # lowercased suffix, "" if none
+    top_dir: Optional[str] = field(init=False)  # first path component; None at the root
+
+    def __post_init__(self) -> None:
+        name = self.path.rsplit("/", 1)[-1]
+        dot = name.rfind(".")
+        self.ext = name[dot:].lower() if 0 < dot < len(name) - 1 else ""
+        self.top_dir = self.path.split("/", 1)[0] if "/" in self.path else None
+
+
+@dataclass
+class FileFindings:
+    """Content-derived results for one file, reusable while the file is unchanged."""
+    binary: Optional[bool] = None       # None until the file's head has been sniffed
+    kind: Optional[str] = None          # executable/archive/media type from magic numbers
+    interpreter: Optional[str] = None   # language named by a #! line
+    scanned: bool = False               # security scan has run
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    network_detected: bool = False
+    detected_domains: List[str] = field(default_factory=list)
+
+
+SUBPROCESS_TIMEOUT_SECONDS = 600  # default limit on one git/npm/pip-audit command (--subprocess-timeout)
+TIMED_OUT = 124                   # exit code reported for a command killed at its timeout, as timeout(1) does
+
+_subprocess_timeout: Optional[float] = SUBPROCESS_TIMEOUT_SECONDS
+# Whether each command runs in a session of its own; off in a budget worker,
+# whose process group must hold its commands for stop_worker to end them
+_command_sessions = True
+
+
+def configure_subprocess_timeout(seconds: Optional[float]) -> None:
+    """Set the wall-clock limit on each external command; None lets commands run indefinitely."""
+    global _subprocess_timeout
+    _subprocess_timeout = seconds
+
+
+def resolve_subprocess_timeout(seconds: float) -> float:
+    if seconds <= 0:
+        raise ValueError(f"--subprocess-timeout must be positive, got '{seconds:g}'")
+    return seconds
+
+
+def timed_out_message(cmd: List[str]) -> str:
+    return f"Timed out after {_subprocess_timeout:g}s: {' '.join(cmd)}"
 
-def run(cmd: List[str], cwd: Optional[Path] = None) -> Tuple[int, str]:
-    p = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True)
-    out = (p.stdout or "") + (p.stderr or "")
-    return p.returncode, out.strip()
+
+def kill_process_group(proc) -> None:
+    """
+    SIGKILL a process started in its own session, with every process it
+    started. The caller has not reaped it yet, so its pid is still its own.
+    A command sharing a budget worker's group is killed alone; what it
+    started is left to stop_worker.
+    """
+    if not _command_sessions:
+        if proc.returncode is None:
+            proc.kill()
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (AttributeError, OSError):  # no process groups (Windows), or already gone
+        if proc.returncode is None:
+            proc.kill()
+
+
+def run_command(
+    cmd: List[str],
+    cwd: Optional[Path] = None,
+    input_text: Optional[str] = None
+) -> Tuple[int, str, str]:
+    """
+    Run cmd in a session of its own, so a timeout kills what it started too
+    (git-remote-https, index-pack, npm's children), not just cmd.
+    Returns (code, stdout, stderr); a timed-out command gives TIMED_OUT.
+    """
+    with subprocess.Popen(
+        cmd, cwd=cwd, text=True, start_new_session=_command_sessions,
+        stdin=subprocess.PIPE if input_text is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    ) as proc:
+        try:
+            stdout, stderr = proc.communicate(input_text, timeout=_subprocess_timeout)
+        except subprocess.TimeoutExpired:
+            kill_process_group(proc)
+            proc.communicate()
+            return TIMED_OUT, "", timed_out_message(cmd)
+    return proc.returncode, stdout or "", stderr or ""
+
+
+def run(cmd: List[str], cwd: Optional[Path] = None, input_text: Optional[str] = None) -> Tuple[int, str]:
+    code, stdout, stderr = run_command(cmd, cwd, input_text)
+    return code, (stdout + stderr).strip()
+
+
+def run_git(git_dir: Path, args: List[str], input_text: Optional[str] = None) -> Tuple[int, str]:
+    """Run git against a bare repo. Returns (code, stdout) on success and (code, stderr) on failure."""
+    code, stdout, stderr = run_command(["git", "--git-dir", str(git_dir), *args], input_text=input_text)
+    return code, (stdout if code == 0 else stderr.strip())
 
 
 def fail(msg: str) -> None:
@@ -210,6 +477,40 @@ def load_marketplace() -> dict:
         return json.load(f)
 
 
+def load_base_plugins(ref: str) -> Tuple[Optional[List[dict]], str]:
+    """
+    Plugin entries of the marketplace index as of a git ref.
+    An index that did not exist yet at the ref yields no entries.
+    Returns (plugins, error).
+    """
+    code, out = run(["git", "rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}"], cwd=ROOT)
+    if code != 0:
+        return None, f"Unknown git ref for --changed-since: '{ref}'"
+    rel = MARKETPLACE_FILE.relative_to(ROOT).as_posix()
+    code, stdout, stderr = run_command(["git", "show", f"{ref}:{rel}"], cwd=ROOT)
+    if code == TIMED_OUT:
+        return None, stderr
+    if code != 0:
+        return [], ""
+    try:
+        plugins = json.loads(stdout).get("plugins", [])
+    except (json.JSONDecodeError, AttributeError):
+        return [], ""
+    return (plugins if isinstance(plugins, list) else []), ""
+
+
+def changed_entry_indices(plugins: List[dict], base_plugins: List[dict]) -> Set[int]:
+    """Indices of entries that are new or differ from the same-named entry at the base."""
+    base = {
+        p.get("name"): p for p in base_plugins
+        if isinstance(p, dict) and isinstance(p.get("name"), str)
+    }
+    return {
+        idx for idx, plugin in enumerate(plugins)
+        if not isinstance(plugin, dict) or base.get(plugin.get("name")) != plugin
+    }
+
+
 def ensure_tmp() -> None:
     if TMP_DIR.exists():
         shutil.rmtree(TMP_DIR)
@@ -221,13 +522,531 @@ def cleanup_tmp() -> None:
         shutil.rmtree(TMP_DIR)
 
 
-def clone_repo(url: str, dest: Path) -> Tuple[bool, str]:
-    code, out = run(["git", "clone", "--depth", "1", url, str(dest)])
+# =========================
+# MIRROR CACHE
+# =========================
+
+# One lock per mirror: two entries may share a source URL and git refuses
+# concurrent fetches / worktree updates on the same repository.
+_mirror_locks: Dict[str, threading.Lock] = {}
+_mirror_locks_guard = threading.Lock()
+
+
+def _mirror_lock(mirror: Path) -> threading.Lock:
+    with _mirror_locks_guard:
+        return _mirror_locks.setdefault(str(mirror), threading.Lock())
+
+
+def normalize_source_url(url: str) -> str:
+    """Normalize a git source URL so equivalent spellings share one mirror."""
+    url = url.strip().rstrip("/")
+    if url.endswith(".git"):
+        url = url[:-len(".git")]
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        return url
+    host, slash, path = rest.partition("/")
+    return f"{scheme.lower()}://{host.lower()}{slash}{path}"
+
+
+def mirror_path(url: str) -> Path:
+    """Location of the bare mirror for a source URL inside MIRRORS_DIR."""
+    normalized = normalize_source_url(url)
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+    slug = re.sub(r"[^A-Za-z0-9._-]", "_", normalized.rsplit("/", 1)[-1]) or "repo"
+    return MIRRORS_DIR / f"{slug}-{digest}.git"
+
+
+def mirror_update_command(url: str, mirror: Path) -> Tuple[Optional[Path], List[str]]:
+    """
+    The git command that creates or incrementally updates the mirror for url.
+    A new mirror is cloned next to its final location and renamed into place
+    by finish_mirror_update, so an interrupted clone never leaves a
+    half-populated mirror behind. Returns (partial clone dir or None, command).
+    """
+    if (mirror / "HEAD").exists():
+        return None, ["git", "--git-dir", str(mirror), "fetch", "--prune", "--quiet", "origin"]
+    MIRRORS_DIR.mkdir(parents=True, exist_ok=True)
+    partial = mirror.with_name(mirror.name + ".partial")
+    if partial.exists():
+        shutil.rmtree(partial)
+    # Blobless: commits and trees only; blobs are fetched after the tree precheck
+    return partial, ["git", "clone", "--mirror", "--filter=blob:none", "--quiet", url, str(partial)]
+
+
+def finish_mirror_update(mirror: Path, partial: Optional[Path], code: int, out: str) -> Tuple[Optional[Path], str]:
+    """Move a completed clone into place, or clean up a failed one. Returns (mirror_path, error)."""
+    if code != 0:
+        if partial is not None:
+            shutil.rmtree(partial, ignore_errors=True)
+        return None, out
+    if partial is not None:
+        partial.rename(mirror)
+    return mirror, ""
+
+
+def fetch_mirror(url: str) -> Tuple[Optional[Path], str]:
+    """
+    Create or incrementally update the bare mirror for url.
+    Returns (mirror_path, error). mirror_path is None on failure.
+    """
+    mirror = mirror_path(url)
+    with _mirror_lock(mirror):
+        partial, cmd = mirror_update_command(url, mirror)
+        code, out = run(cmd)
+        return finish_mirror_update(mirror, partial, code, out)
+
+
+def materialize_worktree(
+    mirror: Path,
+    dest: Path,
+    rev: str = "HEAD",
+    paths: Optional[List[str]] = None
+) -> Tuple[bool, str]:
+    """
+    Check out rev of a mirror into dest as a detached worktree sharing its object store.
+    When paths is given only those files are written, so blobs outside it are never fetched.
+    """
+    with _mirror_lock(mirror):
+        # Worktrees from previous runs were removed with TMP_DIR; forget them
+        run(["git", "--git-dir", str(mirror), "worktree", "prune"])
+        add_cmd = ["git", "--git-dir", str(mirror), "worktree", "add", "--detach", "--force", "--quiet"]
+        if paths is not None:
+            add_cmd.append("--no-checkout")
+        code, out = run(add_cmd + [str(dest), rev])
+        if code == 0 and paths is not None:
+            code, out = run(["git", "read-tree", rev], cwd=dest)
+            if code == 0 and paths:
+                code, out = run(["git", "checkout-index", "-z", "--stdin"], cwd=dest, input_text="\0".join(paths))
+    if code != 0:
+        return False, out
+    return True, ""
+
+
+def resolve_commit(mirror: Path, rev: str = "HEAD") -> Optional[str]:
+    code, out = run(["git", "--git-dir", str(mirror), "rev-parse", "--verify", f"{rev}^{{commit}}"])
+    return out if code == 0 else None
+
+
+# =========================
+# PARTIAL CLONE PRECHECK
+# =========================
+
+def list_tree(mirror: Path, rev: str) -> Tuple[Optional[List[RepoFile]], str]:
+    """
+    List the files of rev from tree objects alone (no blobs needed), skipping SKIP_DIRS.
+    Sizes are filled in by precheck_repo once blobs are present.
+    Returns (entries, error).
+    """
+    code, out = run_git(mirror, ["ls-tree", "-r", "-z", "--full-tree", rev])
+    if code != 0:
+        return None, out
+    entries: List[RepoFile] = []
+    for record in out.split("\0"):
+        if not record:
+            continue
+        meta, path = record.split("\t", 1)
+        mode, obj_type, oid = meta.split()
+        if obj_type != "blob":
+            continue  # submodule gitlinks carry no content
+        if any(part in SKIP_DIRS for part in path.split("/")[:-1]):
+            continue
+        entries.append(RepoFile(path=path, is_symlink=mode == "120000", oid=oid, mode=int(mode, 8)))
+    entries.sort(key=lambda e: e.path)
+    return entries, ""
+
+
+def missing_blobs(mirror: Path, rev: str) -> Set[str]:
+    """Blobs of rev's tree not present locally (listing them never triggers a fetch)."""
+    code, out = run_git(mirror, ["rev-list", "--objects", "--missing=print", f"{rev}^{{tree}}"])
+    if code != 0:
+        return set()
+    return {line[1:].strip() for line in out.splitlines() if line.startswith("?")}
+
+
+def fetch_blobs_within_limit(mirror: Path, rev: str) -> Tuple[bool, str]:
+    """
+    Fetch the blobs of rev's tree that are at most MAX_FILE_SIZE_BYTES.
+    Larger blobs are filtered out server-side and never transferred.
+    """
+    code, tree = run_git(mirror, ["rev-parse", "--verify", f"{rev}^{{tree}}"])
     if code != 0:
+        return False, tree
+    code, out = run(blob_fetch_command(mirror, tree.strip()))
+    return code == 0, out
+
+
+def blob_fetch_command(mirror: Path, tree: str) -> List[str]:
+    """
+    The git command fetching a tree's blobs of at most MAX_FILE_SIZE_BYTES into a mirror.
+
+    Trade-off: --refetch skips negotiation, so every blob under the limit in
+    the tree is transferred again, not only the missing ones, each time a
+    plugin's tree changes. Without it git sees the tree as already local and
+    fetches nothing. Blobs wanted by oid would be incremental, but a server
+    sends an explicitly wanted blob whatever its size, so the limit would no
+    longer bound what a hostile repo can make a run download.
+    """
+    return [
+        "git", "--git-dir", str(mirror),
+        "-c", "gc.auto=0", "-c", "maintenance.auto=false",
+        "fetch", "--refetch", "--no-tags", "--no-write-fetch-head", "--quiet",
+        f"--filter=blob:limit={MAX_FILE_SIZE_BYTES + 1}",
+        "origin", tree,
+    ]
+
+
+def blob_sizes(mirror: Path, oids: List[str]) -> Dict[str, int]:
+    """Sizes of locally present blobs."""
+    if not oids:
+        return {}
+    code, out = run_git(
+        mirror,
+        ["cat-file", "--batch-check=%(objectname) %(objectsize)"],
+        input_text="\n".join(oids) + "\n",
+    )
+    sizes: Dict[str, int] = {}
+    if code != 0:
+        return sizes
+    for line in out.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[1].isdigit():
+            sizes[parts[0]] = int(parts[1])
+    return sizes
+
+
+def precheck_repo(mirror: Path, rev: str) -> Tuple[List[str], List[RepoFile]]:
+    """
+    Enforce file count, file type and size limits before any checkout.
+
+    File count and disallowed extensions are checked from tree objects alone,
+    before any blob is transferred. Blobs are then fetched with a server-side
+    size filter, so a file over MAX_FILE_SIZE_BYTES is rejected without being
+    downloaded. Returns (errors, entries).
+    """
+    entries, error = list_tree(mirror, rev)
+    if entries is None:
+        return [f"Could not list repository tree: {error}"], []
+
+    errors = tree_limit_errors(entries)
+    if errors:
+        return errors, entries
+
+    wanted = {e.oid for e in entries}
+    with _mirror_lock(mirror):
+        if missing_blobs(mirror, rev) & wanted:
+            success, error = fetch_blobs_within_limit(mirror, rev)
+            if not success:
+                return [f"Could not fetch repository contents: {error}"], entries
+        still_missing = missing_blobs(mirror, rev) & wanted
+
+    sizes = blob_sizes(mirror, [e.oid for e in entries if e.oid not in still_missing])
+    repo_size = 0
+    for entry in entries:
+        if entry.oid in still_missing:
+            errors.append(
+                f"File too large: {entry.path} (> {MAX_FILE_SIZE_BYTES/1024/1024:.2f}MB, not downloaded)"
+            )
+            repo_size += MAX_FILE_SIZE_BYTES + 1
+        else:
+            entry.size = sizes.get(entry.oid, 0)
+            repo_size += entry.size
+
+    if repo_size > MAX_REPO_SIZE_BYTES:
+        errors.append(
+            f"Repo too large: {repo_size/1024/1024:.2f}MB > {MAX_REPO_SIZE_BYTES/1024/1024:.2f}MB"
+        )
+
+    return errors, entries
+
+
+def tree_limit_errors(entries: List[RepoFile]) -> List[str]:
+    """File count and file type violations, from tree metadata alone."""
+    errors: List[str] = []
+    if len(entries) > MAX_FILES_COUNT:
+        errors.append(f"Repo contains too many files: {len(entries)} > {MAX_FILES_COUNT}")
+
+    for entry in entries:
+        if entry.ext in DISALLOWED_EXTENSIONS:
+            errors.append(f"Disallowed file type in repo: {entry.path} ({entry.ext})")
+    return errors
+
+
+def clone_repo(url: str, dest: Path) -> Tuple[bool, str]:
+    mirror, out = fetch_mirror(url)
+    if mirror is None:
         return False, f"Could not clone {url}: {out}"
+    errors, entries = precheck_repo(mirror, "HEAD")
+    if errors:
+        return False, f"Could not clone {url}: {errors[0]}"
+    success, out = materialize_worktree(mirror, dest, "HEAD", [e.path for e in entries])
+    if not success:
+        return False, f"Could not check out {url}: {out}"
     return True, ""
 
 
+# =========================
+# ASYNC FETCH
+# =========================
+
+FETCH_HOST_CONCURRENCY = 4   # git fetches in flight per host
+FETCH_RETRIES = 3            # further attempts after a transient network error
+FETCH_BACKOFF_SECONDS = 1.0  # wait before the first retry, doubled after each
+
+# git errors caused by the network or an overloaded server, not by the request
+TRANSIENT_GIT_ERRORS = (
+    "Could not resolve host", "Failed to connect", "Connection timed out", "Connection reset",
+    "Operation timed out", "early EOF", "unexpected disconnect", "remote end hung up",
+    "RPC failed", "returned error: 429", "returned error: 5",
+)
+
+
+async def run_async(cmd: List[str], cwd: Optional[Path] = None) -> Tuple[int, str]:
+    """run() as a coroutine: the event loop keeps going while the subprocess runs."""
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, cwd=cwd, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE, start_new_session=_command_sessions,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), _subprocess_timeout)
+    except asyncio.TimeoutError:
+        kill_process_group(proc)
+        await proc.wait()
+        return TIMED_OUT, timed_out_message(cmd)
+    out = stdout.decode("utf-8", errors="replace") + stderr.decode("utf-8", errors="replace")
+    return proc.returncode, out.strip()
+
+
+async def run_network_git(cmd: List[str]) -> Tuple[int, str]:
+    """run_async for a git command talking to a remote, retried with backoff on transient errors."""
+    delay = FETCH_BACKOFF_SECONDS
+    for attempt in range(FETCH_RETRIES + 1):
+        code, out = await run_async(cmd)
+        if code == 0 or attempt == FETCH_RETRIES or not any(e in out for e in TRANSIENT_GIT_ERRORS):
+            return code, out
+        await asyncio.sleep(delay)
+        delay *= 2
+    return code, out
+
+
+async def fetch_mirror_async(url: str) -> Tuple[Optional[Path], str]:
+    """
+    fetch_mirror on the event loop, with retries. Callers fetch each mirror
+    from one coroutine at a time (see validate_prefetched).
+    """
+    mirror = mirror_path(url)
+    partial, cmd = mirror_update_command(url, mirror)
+    code, out = await run_network_git(cmd)
+    return finish_mirror_update(mirror, partial, code, out)
+
+
+async def prefetch_blobs(mirror: Path) -> None:
+    """
+    Fetch the blobs precheck_repo would fetch for HEAD, so validation finds
+    them local. Trees failing the metadata limits are left alone (precheck
+    rejects them without their contents), as are failures, which precheck
+    reports when it retries the fetch.
+    """
+    entries, _ = await asyncio.to_thread(list_tree, mirror, "HEAD")
+    if entries is None or tree_limit_errors(entries):
+        return
+    if not await asyncio.to_thread(missing_blobs, mirror, "HEAD") & {e.oid for e in entries}:
+        return
+    code, tree = await run_async(["git", "--git-dir", str(mirror), "rev-parse", "--verify", "HEAD^{tree}"])
+    if code == 0:
+        await run_network_git(blob_fetch_command(mirror, tree))
+
+
+async def fetch_source(
+    url: str,
+    host_limits: Dict[str, asyncio.Semaphore]
+) -> Tuple[Optional[Path], str, float]:
+    """
+    Bring the mirror for url and the blobs of its HEAD up to date, with at most
+    FETCH_HOST_CONCURRENCY fetches per host.
+    Returns (mirror_path, error, seconds spent fetching, not waiting for the host).
+    """
+    host = normalize_source_url(url).partition("://")[2].split("/", 1)[0]
+    limit = host_limits.setdefault(host, asyncio.Semaphore(FETCH_HOST_CONCURRENCY))
+    async with limit:
+        started = time.perf_counter()
+        try:
+            mirror, error = await fetch_mirror_async(url)
+            if mirror is not None:
+                await prefetch_blobs(mirror)
+        except Exception as e:
+            mirror, error = None, str(e)
+    return mirror, error, time.perf_counter() - started
+
+
+# =========================
+# PLUGIN SOURCES
+# =========================
+
+# Unread blob content a limited read skips in place; beyond this the
+# cat-file process is restarted rather than streaming the rest of the blob
+BLOB_DRAIN_BYTES = 64 * 1024
+
+
+class BlobReader:
+    """
+    Stream blob contents from one long-lived `git cat-file --batch` process.
+    A blob missing from a blobless mirror is fetched lazily by cat-file, so a
+    watchdog kills the process when one read outlasts the subprocess timeout.
+    """
+
+    def __init__(self, git_dir: Path):
+        self._cmd = ["git", "--git-dir", str(git_dir), "cat-file", "--batch"]
+        self._proc = self._start()
+        self._busy_since: Optional[float] = None
+        self._closed = threading.Event()
+        self._timed_out = False
+        if _subprocess_timeout is not None:
+            threading.Thread(target=self._watchdog, args=(_subprocess_timeout,), daemon=True).start()
+
+    def _start(self) -> subprocess.Popen:
+        return subprocess.Popen(
+            self._cmd, start_new_session=_command_sessions,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+
+    def _skip(self, count: int) -> None:
+        """Discard the unread rest of a blob (and its trailing newline)."""
+        if count > BLOB_DRAIN_BYTES:
+            kill_process_group(self._proc)
+            self._proc.wait()
+            self._proc.stdin.close()
+            self._proc.stdout.close()
+            self._proc = self._start()
+            return
+        while count > 0:
+            chunk = self._proc.stdout.read(count)
+            if not chunk:
+                break
+            count -= len(chunk)
+
+    def _watchdog(self, timeout: float) -> None:
+        while not self._closed.wait(min(1.0, timeout / 4)):
+            started = self._busy_since
+            if started is not None and time.monotonic() - started > timeout:
+                self._timed_out = True
+                kill_process_group(self._proc)
+                return
+
+    def read(self, oid: str, limit: int = -1) -> bytes:
+        """The blob's content, or only its first limit bytes when limit is not negative."""
+        self._busy_since = time.monotonic()
+        try:
+            self._proc.stdin.write(oid.encode("ascii") + b"\n")
+            self._proc.stdin.flush()
+            header = self._proc.stdout.readline().split()
+            if len(header) == 3:
+                size = int(header[2])
+                wanted = size if limit < 0 else min(size, limit)
+                data = self._proc.stdout.read(wanted)
+                self._skip(size - wanted + 1)  # the rest, and the trailing newline
+        except OSError:
+            header = []
+        finally:
+            self._busy_since = None
+        if self._timed_out:
+            raise TimeoutError(timed_out_message(self._cmd))
+        if len(header) != 3:
+            raise KeyError(f"object not available: {oid}")
+        return data
+
+    def close(self) -> None:
+        self._closed.set()
+        try:
+            self._proc.stdin.close()
+        except OSError:
+            pass  # killed by the watchdog
+        self._proc.wait()
+        self._proc.stdout.close()
+
+    def __enter__(self) -> "BlobReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class WorkingTreeSource:
+    """Plugin files read from a checked-out directory."""
+
+    def __init__(self, repo_path: Path):
+        self.root = repo_path
+        self.files, self.limit_error = inventory_repo(repo_path)
+
+    def exists(self, path: str) -> bool:
+        return (self.root / path).exists()
+
+    def read(self, path: str, limit: int = -1) -> bytes:
+        with (self.root / path).open("rb") as f:
+            return f.read(limit)
+
+    def scan_input(self, path: str) -> Path:
+        """What the scanner reads: the file itself, memory-mapped by open_scan_buffer."""
+        return self.root / path
+
+
+class GitTreeSource:
+    """Plugin files read straight from a git object database; no working tree is written."""
+
+    limit_error: Optional[str] = None  # precheck_repo already enforced the repo limits
+
+    def __init__(self, files: List[RepoFile], reader: BlobReader):
+        self.files = files
+        self._reader = reader
+        self._by_path = {f.path: f for f in files}
+        self._dirs: Set[str] = set()
+        for f in files:
+            parts = f.path.split("/")[:-1]
+            for i in range(1, len(parts) + 1):
+                self._dirs.add("/".join(parts[:i]))
+
+    def exists(self, path: str) -> bool:
+        return path in self._by_path or path in self._dirs
+
+    def read(self, path: str, limit: int = -1) -> bytes:
+        return self._reader.read(self._by_path[path].oid, limit)
+
+    def scan_input(self, path: str) -> bytes:
+        """What the scanner reads: the blob, already in memory."""
+        return self.read(path)
+
+
+def decode_text(data: bytes) -> str:
+    """Decode file bytes the way Path.read_text(errors='ignore') does, newlines included."""
+    return data.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+
+
+@contextmanager
+def open_scan_buffer(data: Union[bytes, Path]):
+    """Yield a byte buffer for a source's scan input, memory-mapping files."""
+    if isinstance(data, bytes):
+        yield data
+        return
+    with data.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield buf
+
+
+def scan_input_size(data: Union[bytes, Path]) -> int:
+    return len(data) if isinstance(data, bytes) else data.stat().st_size
+
+
+def write_dependency_files(source, dest: Path) -> None:
+    """Materialize only the dependency manifests the CVE scanners need."""
+    dest.mkdir(parents=True, exist_ok=True)
+    for name in DEPENDENCY_FILES:
+        if source.exists(name):
+            (dest / name).write_bytes(source.read(name))
+
+
 # =========================
 # CVE SCANNING
 # =========================
@@ -285,6 +1104,10 @@ def scan_python_cves(repo_path: Path, tier: str) -> Tuple[List[str], List[str]]:
             cwd=repo_path
         )
 
+        if code == TIMED_OUT:
+            warnings.append(f"CVE SCAN: pip-audit timed out on {req_file.name}, skipping")
+            continue
+
         if code != 0 and "No dependencies" not in output:
             # Try to parse JSON output for vulnerabilities
             try:
@@ -350,6 +1173,10 @@ def scan_npm_cves(repo_path: Path, tier: str) -> Tuple[List[str], List[str]]:
     # Run npm audit
     code, output = run(["npm", "audit", "--json"], cwd=repo_path)
 
+    if code == TIMED_OUT:
+        warnings.append("CVE SCAN: npm audit timed out, skipping")
+        return errors, warnings
+
     if code != 0:
         try:
             import json
@@ -411,46 +1238,95 @@ def scan_dependencies_for_cves(repo_path: Path, tier: str) -> Tuple[List[str], L
     return all_errors, all_warnings
 
 
-def exists_any(repo_path: Path, paths: List[str]) -> Optional[str]:
+def exists_any(source, paths: List[str]) -> Optional[str]:
     for p in paths:
-        if (repo_path / p).exists():
+        if source.exists(p):
             return p
     return None
 
 
+PRINTABLE_BYTES = bytes(range(32, 127)) + b"\t\n\r"
+
+
+def detect_magic(head: bytes) -> Optional[str]:
+    """Type of executable, archive or media file the leading bytes identify, if any."""
+    for magic, kind in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return kind
+    # PE: DOS stub whose e_lfanew points at a PE signature
+    if head.startswith(b"MZ") and len(head) >= 64:
+        offset = int.from_bytes(head[60:64], "little")
+        if head[offset:offset + 4] == b"PE\x00\x00" or (offset >= len(head) and b"\x00" in head[:64]):
+            return "PE executable"
+    return None
+
+
+def is_probably_binary_data(chunk: bytes) -> bool:
+    if b"\x00" in chunk or detect_magic(chunk):
+        return True
+    if not chunk:
+        return False
+    # Deleting the printable bytes leaves the non-printable ones, counted in C
+    non_printable = len(chunk.translate(None, PRINTABLE_BYTES))
+    ratio = non_printable / max(1, len(chunk))
+    return ratio > 0.35
+
+
 def is_probably_binary(path: Path) -> bool:
     try:
         with path.open("rb") as f:
-            chunk = f.read(MAX_READ_BYTES_FOR_BINARY_CHECK)
-        if b"\x00" in chunk:
-            return True
-        printable = set(range(32, 127)) | {9, 10, 13}
-        if not chunk:
-            return False
-        non_printable = sum(1 for b in chunk if b not in printable)
-        ratio = non_printable / max(1, len(chunk))
-        return ratio > 0.35
+            return is_probably_binary_data(f.read(MAX_READ_BYTES_FOR_BINARY_CHECK))
     except Exception:
         return True
 
 
-def walk_repo_files(repo_path: Path) -> List[Path]:
-    files: List[Path] = []
-    for root, dirs, filenames in os.walk(repo_path):
-        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
-        for fn in filenames:
-            files.append(Path(root) / fn)
-    return files
-
+def inventory_repo(repo_path: Path) -> Tuple[List[RepoFile], Optional[str]]:
+    """
+    List a working tree's files, lstat-ing each directory entry exactly once.
 
-def get_repo_size_bytes(files: List[Path]) -> int:
-    total = 0
-    for f in files:
+    Symlinks are recorded, never followed (a symlinked directory is one entry,
+    as in a git tree). The walk stops as soon as MAX_FILES_COUNT or
+    MAX_REPO_SIZE_BYTES is exceeded, so a pathological checkout costs no more
+    than the limits allow. Returns (files sorted by path, limit_error).
+    """
+    files: List[RepoFile] = []
+    total_size = 0
+    stack = [""]
+    while stack:
+        prefix = stack.pop()
         try:
-            total += f.stat().st_size
-        except Exception:
+            it = os.scandir(os.path.join(repo_path, prefix) if prefix else repo_path)
+        except OSError:
             continue
-    return total
+        with it:
+            for entry in it:
+                rel = prefix + entry.name
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if stat.S_ISDIR(st.st_mode):
+                    if entry.name not in SKIP_DIRS:
+                        stack.append(rel + "/")
+                    continue
+                if entry.name == ".git":
+                    # gitdir pointer file of a worktree checkout
+                    continue
+                files.append(RepoFile(
+                    path=rel, size=st.st_size, is_symlink=stat.S_ISLNK(st.st_mode), mode=st.st_mode
+                ))
+                total_size += st.st_size
+                if len(files) > MAX_FILES_COUNT:
+                    return sorted(files, key=lambda e: e.path), (
+                        f"Repo contains too many files: > {MAX_FILES_COUNT} (inventory stopped at the limit)"
+                    )
+                if total_size > MAX_REPO_SIZE_BYTES:
+                    return sorted(files, key=lambda e: e.path), (
+                        f"Repo too large: > {MAX_REPO_SIZE_BYTES/1024/1024:.2f}MB (inventory stopped at the limit)"
+                    )
+    # Same order as list_tree, so both sources report findings identically
+    files.sort(key=lambda e: e.path)
+    return files, None
 
 
 # =========================
@@ -688,147 +1564,1100 @@ def parse_plugin_entry(plugin: dict) -> Tuple[Optional[str], Optional[str], Opti
 # SECURITY SCANNING
 # =========================
 
-def scan_file_for_secrets(file_path: Path, content: str) -> List[Tuple[int, str, str]]:
-    """Scan file content for hardcoded secrets."""
-    findings: List[Tuple[int, str, str]] = []
-    lines = content.split("\n")
-
-    for line_num, line in enumerate(lines, 1):
-        stripped = line.strip()
-        if stripped.startswith("#") or stripped.startswith("//") or stripped.startswith("*"):
-            continue
-
-        for pattern, name in SECRET_PATTERNS:
-            if re.search(pattern, line):
-                match = re.search(pattern, line)
-                if match:
-                    matched = match.group(0)
-                    if len(matched) > 20:
-                        matched = matched[:8] + "..." + matched[-4:]
-                    findings.append((line_num, name, matched))
+Rule = Tuple["re.Pattern", str, Optional[str]]
+
+COMMENT_PREFIXES = ("#", "//", "*")
+
+# Bytes after which a buffer's lines and keywords could differ from its decoded
+# text: non-ASCII (case folding, dropped invalid UTF-8) and a CR not followed by
+# LF (a line break once decoded)
+TEXT_ONLY_BYTES_RE = re.compile(rb"[\x80-\xff]|\r(?!\n)")
+
+SCAN_WINDOW_BYTES = 256 * 1024  # case-folded slice of a buffer searched for keywords at a time
+
+# Rules run on long lines in overlapping windows, so a rule that backtracks
+# (e.g. a URL pattern on a minified bundle) costs at most a window's worth per
+# window: linear in the line. A match up to SCAN_LINE_OVERLAP chars long always
+# lies wholly inside some window; one up to SCAN_MATCH_MAX_LENGTH chars is found
+# by searching on past a window holding the rule's literal but no match.
+SCAN_LINE_WINDOW = 1024
+SCAN_LINE_OVERLAP = 256
+SCAN_MATCH_MAX_LENGTH = 1024
+
+# A file whose head has a line this long and this little whitespace is minified
+# or generated: scanned in one pass over the whole buffer, with the findings of
+# each rule collapsed into one counted finding
+MINIFIED_LINE_LENGTH = 500
+MINIFIED_MAX_WHITESPACE = 0.1
+
+# Time one rule and all rules may spend on a file before scanning stops short
+# and the file is reported as partially scanned (rejected for curated plugins)
+SCAN_RULE_BUDGET_SECONDS = 2.0
+SCAN_FILE_BUDGET_SECONDS = 5.0
+
+# Non-ASCII characters that (?i) rules match as ASCII letters; folded along with A-Z
+CASE_FOLD = str.maketrans({
+    **{c: c.lower() for c in string.ascii_uppercase},
+    "\u0130": "i", "\u0131": "i", "\u017f": "s", "\u212a": "k",
+})
+
+# Maps token characters to "t" and everything else to " ", so token runs are
+# found with bytes.find instead of a regex retried at every offset
+SECRET_TOKEN_TABLE = bytes(
+    0x74 if chr(c) in SECRET_TOKEN_CHARS else 0x20 for c in range(256)
+)
+HEX_TOKEN_RE = re.compile(r"[0-9a-fA-F]+")
+URL_PREFIX_RE = re.compile(rb"://[^\s'\"`<>()]*\Z")  # token is part of a URL's host or path
+DIGIT_RE = re.compile(r"[0-9]")
+BASE64_ALPHABET = SECRET_TOKEN_CHARS
+HEX_ALPHABET = "0123456789abcdef"
+# c * log2(c) for every count a token can hold
+NLOG2N = [0.0] + [c * math.log2(c) for c in range(1, ENTROPY_MAX_LENGTH + 3)]
+
+
+class ScanBudget:
+    """Time spent scanning one file, per rule and in total."""
+
+    def __init__(self):
+        self.deadline = time.perf_counter() + SCAN_FILE_BUDGET_SECONDS
+        self.spent: Dict["re.Pattern", float] = {}
+        self.skipped: List[str] = []  # names of rules that ran out of time
+        self.exhausted = False
+
+    def expired(self) -> bool:
+        if not self.exhausted and time.perf_counter() > self.deadline:
+            self.exhausted = True
+        return self.exhausted
+
+    def allows(self, regex: "re.Pattern") -> bool:
+        return self.spent.get(regex, 0.0) <= SCAN_RULE_BUDGET_SECONDS
+
+    def charge(self, regex: "re.Pattern", name: str, seconds: float) -> None:
+        spent = self.spent[regex] = self.spent.get(regex, 0.0) + seconds
+        if spent > SCAN_RULE_BUDGET_SECONDS and name not in self.skipped:
+            self.skipped.append(name)
+
+    def shortfall(self) -> List[str]:
+        """Why the scan is incomplete; empty when every rule saw every line."""
+        reasons = [f"rule '{name}' over its time budget" for name in self.skipped]
+        if self.exhausted:
+            reasons.append("file over its time budget")
+        return reasons
+
+
+@dataclass(frozen=True)
+class ScanRules:
+    """Every security rule compiled once, plus the matchers that pick candidate lines."""
+    matcher: "re.Pattern"                 # all rules combined (exhaustive scan)
+    keywords: Optional["re.Pattern"]      # required literals of anchored rules, on folded text
+    unanchored: Optional["re.Pattern"]    # rules without a usable literal, combined
+    secrets: Tuple[Rule, ...]
+    telemetry: Tuple[Rule, ...]
+    network: Tuple[Rule, ...]
+    bytes_keywords: Optional["re.Pattern"]  # keywords, for case-folded byte buffers
+    max_keyword: int
+
+
+def scoped_pattern(pattern: str) -> str:
+    """Turn a leading global inline flag group like (?i) into a scoped (?i:...) group."""
+    m = re.match(r"\(\?([aiLmsux]+)\)", pattern)
+    if m:
+        return f"(?{m.group(1)}:{pattern[m.end():]})"
+    return f"(?:{pattern})"
+
+
+def fold_case(text: str) -> str:
+    """Lowercase ASCII letters (and their non-ASCII (?i) equivalents) without changing offsets."""
+    return text.lower() if text.isascii() else text.translate(CASE_FOLD)
+
+
+def required_literal(pattern: str) -> Optional[str]:
+    """
+    The longest run of literal characters every match of the pattern contains,
+    case-folded, or None when the pattern has no run of at least two characters.
+    """
+    best = ""
+    run: List[str] = []
+
+    def flush() -> None:
+        nonlocal best
+        if len(run) > len(best):
+            best = "".join(run)
+        run.clear()
+
+    def walk(items) -> None:
+        for op, av in items:
+            if op == sre_constants.LITERAL:
+                run.append(chr(av))
+            elif op == sre_constants.SUBPATTERN:
+                walk(av[-1])
+            else:
+                flush()
+                if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+                    walk(av[2])
+                    flush()
+        flush()
+
+    walk(sre_parse.parse(pattern))
+    return fold_case(best) if len(best) >= 2 else None
+
+
+def keyword_matcher(keywords: Set[str]) -> Optional["re.Pattern"]:
+    """Compile keywords into a trie-shaped regex so each position is matched in one walk."""
+    if not keywords:
+        return None
+    trie: Dict[str, dict] = {}
+    for word in keywords:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: Dict[str, dict]) -> str:
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = "(?:" + "|".join(alts) + ")" if len(alts) > 1 or "" in node else alts[0]
+        # A keyword ends here: any one is enough to flag the line
+        return "" if "" in node else body
+
+    return re.compile(emit(trie))
+
+
+_rules_cache: Dict[Tuple, ScanRules] = {}
+_rules_lock = threading.Lock()
+
+
+def network_patterns_for(language: Optional[str]) -> List[Tuple[str, str]]:
+    """Network rules routed to a language; every rule when the language is unknown."""
+    groups = LANGUAGE_RULE_GROUPS.get(language)
+    if groups is None:
+        return NETWORK_PATTERNS
+    routed = [p for group, patterns in NETWORK_RULE_GROUPS.items() if group in groups for p in patterns]
+    return routed + TELEMETRY_PATTERNS
+
+
+def scan_rules(language: Optional[str] = None) -> ScanRules:
+    """Compiled rules for the current pattern lists (recompiled only if they change)."""
+    key = (tuple(SECRET_PATTERNS), tuple(TELEMETRY_PATTERNS), tuple(network_patterns_for(language)))
+    with _rules_lock:
+        rules = _rules_cache.get(key)
+        if rules is None:
+            literals = {p: required_literal(p) for patterns in key for p, _ in patterns}
+            secrets, telemetry, network = (
+                tuple((re.compile(p), name, literals[p]) for p, name in patterns) for patterns in key
+            )
+            unanchored = [p for p, literal in literals.items() if literal is None]
+            keywords = keyword_matcher({lit for lit in literals.values() if lit})
+            rules = _rules_cache[key] = ScanRules(
+                matcher=re.compile("|".join(scoped_pattern(p) for p in literals), re.MULTILINE),
+                keywords=keywords,
+                unanchored=(
+                    re.compile("|".join(scoped_pattern(p) for p in unanchored), re.MULTILINE)
+                    if unanchored else None
+                ),
+                secrets=secrets,
+                telemetry=telemetry,
+                network=network,
+                bytes_keywords=re.compile(keywords.pattern.encode("utf-8")) if keywords else None,
+                max_keyword=max((len(lit) for lit in literals.values() if lit), default=0),
+            )
+        return rules
 
-    return findings
 
+def line_starts(content: str) -> List[int]:
+    """Offset of the first character of every line."""
+    starts = [0]
+    pos = content.find("\n")
+    while pos != -1:
+        starts.append(pos + 1)
+        pos = content.find("\n", pos + 1)
+    return starts
 
-def scan_file_for_network(file_path: Path, content: str) -> List[Tuple[int, str, str]]:
-    """Scan file content for network/telemetry code."""
-    findings: List[Tuple[int, str, str]] = []
-    lines = content.split("\n")
 
-    for line_num, line in enumerate(lines, 1):
-        stripped = line.strip()
-        if stripped.startswith("#") or stripped.startswith("//") or stripped.startswith("*"):
+def hit_lines(text: str, matcher: "re.Pattern", starts: List[int]) -> List[int]:
+    """
+    Indices of the lines on which the matcher may match, from one walk over the text.
+    The search resumes at the next line after each hit, so matches that span
+    lines only add candidates and never hide a match on a later line.
+    """
+    indices: List[int] = []
+    pos = 0
+    while True:
+        m = matcher.search(text, pos)
+        if not m:
+            return indices
+        idx = bisect_right(starts, m.start()) - 1
+        indices.append(idx)
+        if idx + 1 >= len(starts):
+            return indices
+        pos = starts[idx + 1]
+
+
+def scan_content(
+    content: str,
+    prefilter: bool = True,
+    language: Optional[str] = None,
+    budget: Optional[ScanBudget] = None
+) -> Tuple[List[Tuple[int, str, str]], List[Tuple[int, str, str]], List[Tuple[int, str, str, str]]]:
+    """
+    Classify rule matches in one traversal of the content.
+    With the prefilter, only lines containing a rule's required literal are
+    matched against that rule; without it every rule runs on every line the
+    combined matcher flags. Both return the same findings.
+    Network rules are limited to those routed to the language, if given.
+    With a budget, scanning stops short once it is spent (see ScanBudget.shortfall).
+    Returns (secret, telemetry, network) findings; network findings carry their line.
+    """
+    rules = scan_rules(language)
+    starts = line_starts(content)
+    if prefilter:
+        folded = fold_case(content)
+        indices = set(hit_lines(folded, rules.keywords, starts)) if rules.keywords else set()
+        if rules.unanchored:
+            indices.update(hit_lines(content, rules.unanchored, starts))
+        candidates = sorted(indices)
+    else:
+        folded = None
+        candidates = hit_lines(content, rules.matcher, starts)
+
+    found: Tuple[list, list, list] = ([], [], [])
+    for idx in candidates:
+        if budget is not None and budget.expired():
+            break
+        end = starts[idx + 1] - 1 if idx + 1 < len(starts) else len(content)
+        line = content[starts[idx]:end]
+        if line.strip().startswith(COMMENT_PREFIXES):
             continue
+        folded_line = folded[starts[idx]:end] if folded is not None else None
+        match_line((rules.secrets, rules.telemetry, rules.network), idx + 1, line, folded_line, found, budget)
 
-        for pattern, name in NETWORK_PATTERNS:
-            if re.search(pattern, line):
-                match = re.search(pattern, line)
-                if match:
-                    matched = match.group(0)[:50]
-                    findings.append((line_num, name, matched))
+    return format_findings(*found)
 
-    return findings
 
+def match_line(
+    groups,
+    line_num: int,
+    line: str,
+    folded_line: Optional[str],
+    found: Tuple[list, list, list],
+    budget: Optional[ScanBudget] = None
+) -> None:
+    """
+    Append (line_num, name, matched, line) for the first match of each rule of
+    each group on the line; with a folded line, rules whose literal is absent are skipped.
+    Rules that have used up their time budget are skipped too.
+    """
+    for rules, out in zip(groups, found):
+        for regex, name, literal in rules:
+            if folded_line is not None and literal is not None and literal not in folded_line:
+                continue
+            if budget is None:
+                match = search_line(regex, line, folded_line, literal)
+            elif budget.allows(regex):
+                started = time.perf_counter()
+                match = search_line(regex, line, folded_line, literal)
+                budget.charge(regex, name, time.perf_counter() - started)
+            else:
+                continue
+            if match:
+                out.append((line_num, name, match.group(0), line))
 
-def scan_file_for_telemetry(file_path: Path, content: str) -> List[Tuple[int, str, str]]:
-    """Scan specifically for telemetry/analytics (always blocked)."""
-    findings: List[Tuple[int, str, str]] = []
-    lines = content.split("\n")
 
-    for line_num, line in enumerate(lines, 1):
-        stripped = line.strip()
-        if stripped.startswith("#") or stripped.startswith("//") or stripped.startswith("*"):
+def search_line(regex: "re.Pattern", line: str, folded_line: Optional[str], literal: Optional[str]):
+    """
+    regex.search on a line, in overlapping windows of SCAN_LINE_WINDOW when it
+    is longer; windows without the rule's literal are skipped. Windows after
+    the first start mid-line, where ^ does not match, as on the whole line.
+    A window with the literal but no match is searched on for up to
+    SCAN_MATCH_MAX_LENGTH chars, so a match longer than the overlap is not lost.
+    """
+    if len(line) <= SCAN_LINE_WINDOW:
+        return regex.search(line)
+    step = SCAN_LINE_WINDOW - SCAN_LINE_OVERLAP
+    for pos in range(0, len(line) - SCAN_LINE_OVERLAP, step):
+        end = min(pos + SCAN_LINE_WINDOW, len(line))
+        if folded_line is not None and literal is not None and folded_line.find(literal, pos, end) == -1:
             continue
+        match = regex.search(line, pos, end)
+        if match is None and end < len(line):
+            match = regex.search(line, pos, min(pos + step + SCAN_MATCH_MAX_LENGTH, len(line)))
+        if match:
+            return match
+    return None
 
-        for pattern, name in TELEMETRY_PATTERNS:
-            if re.search(pattern, line):
-                match = re.search(pattern, line)
-                if match:
-                    matched = match.group(0)[:50]
-                    findings.append((line_num, name, matched))
 
-    return findings
+def looks_minified(head) -> bool:
+    """Whether a file's head (text or bytes) reads as minified/generated code: a very long line, little whitespace."""
+    if isinstance(head, str):
+        head = head.encode("utf-8", errors="ignore")
+    head = bytes(head[:MAX_READ_BYTES_FOR_BINARY_CHECK])
+    if len(head) < MINIFIED_LINE_LENGTH:
+        return False
+    longest = max(len(line) for line in head.split(b"\n"))
+    whitespace = sum(head.count(c) for c in (b" ", b"\t", b"\n", b"\r"))
+    return longest >= MINIFIED_LINE_LENGTH and whitespace / len(head) < MINIFIED_MAX_WHITESPACE
 
 
-def security_scan_repo(
-    repo_path: Path,
-    files: List[Path],
-    tier: str,
-    allowed_domains: Set[str]
-) -> Tuple[List[str], List[str], bool, Set[str]]:
+def scan_minified(
+    content: str,
+    language: Optional[str] = None,
+    budget: Optional[ScanBudget] = None
+) -> Tuple[List[Tuple[int, str, str]], List[Tuple[int, str, str]], List[Tuple[int, str, str, str]]]:
     """
-    Scan repository for security issues.
-    Returns (errors, warnings, network_detected, detected_domains).
+    Every match of every rule in minified/generated code, from one chunked pass
+    per rule over the whole text instead of a walk over its lines. Windows are
+    those of search_line, jumping ahead to the next occurrence of the rule's
+    literal; a match belongs to the window it starts in before the overlap, so
+    none is counted twice. Past the window's matches, the search goes on for
+    up to SCAN_MATCH_MAX_LENGTH chars, so a match longer than the overlap is
+    found too. Comment prefixes mean nothing on a bundle's lines and are not
+    skipped. A network finding's line is the text after its match.
+    Returns the same findings as scan_content, several per rule and line.
     """
-    errors: List[str] = []
-    warnings: List[str] = []
-    network_detected = False
-    detected_domains: Set[str] = set()
+    rules = scan_rules(language)
+    folded = fold_case(content)
+    size = len(content)
+    step = SCAN_LINE_WINDOW - SCAN_LINE_OVERLAP
+
+    found: Tuple[list, list, list] = ([], [], [])
+    for group, out in zip((rules.secrets, rules.telemetry, rules.network), found):
+        for regex, name, literal in group:
+            pos = 0
+            resume = 0  # end of the last match: the next starts here or after
+            while budget is None or (not budget.expired() and budget.allows(regex)):
+                if literal is not None:
+                    hit = folded.find(literal, pos)
+                    if hit == -1:
+                        break
+                    pos = max(pos, max(hit - SCAN_LINE_OVERLAP, 0) // step * step)
+                end = min(pos + SCAN_LINE_WINDOW, size)
+                started = time.perf_counter()
+                for m in regex.finditer(content, max(pos, resume), end):
+                    if end < size and m.start() >= pos + step:
+                        break  # in the overlap: the next window's match
+                    out.append((m.start(), name, m.group(0), content[m.start():m.end() + SCAN_LINE_OVERLAP]))
+                    resume = m.end()
+                if end < size and resume < pos + step:
+                    m = regex.search(content, max(pos, resume), min(pos + step + SCAN_MATCH_MAX_LENGTH, size))
+                    if m is not None and m.start() < pos + step:
+                        # Starts in this window and runs past it: longer than the overlap
+                        out.append((m.start(), name, m.group(0), content[m.start():m.end() + SCAN_LINE_OVERLAP]))
+                        resume = m.end()
+                if budget is not None:
+                    budget.charge(regex, name, time.perf_counter() - started)
+                if end >= size:
+                    break
+                pos = max(pos + step, resume // step * step)
+
+    starts = line_starts(content)
+    for out in found:
+        out[:] = [(bisect_right(starts, offset), name, matched, line) for offset, name, matched, line in out]
+    return format_findings(*found)
+
+
+def format_findings(secrets: list, telemetry: list, network: list):
+    """Shorten matched text for the report; network findings keep their line."""
+    return (
+        [
+            (n, name, matched[:8] + "..." + matched[-4:] if len(matched) > 20 else matched)
+            for n, name, matched, _ in secrets
+        ],
+        [(n, name, matched[:50]) for n, name, matched, _ in telemetry],
+        [(n, name, matched[:50], line) for n, name, matched, line in network],
+    )
 
-    content_dirs = {"commands", "hooks", "agents", "skills"}
 
-    for f in files:
-        if f.suffix.lower() not in SCANNABLE_EXTENSIONS:
-            continue
+def scan_buffer(
+    buf,
+    language: Optional[str] = None,
+    budget: Optional[ScanBudget] = None
+) -> Tuple[List[Tuple[int, str, str]], List[Tuple[int, str, str]], List[Tuple[int, str, str, str]]]:
+    """
+    scan_content over a byte buffer (bytes or mmap) without decoding it: keywords
+    are searched in case-folded windows of SCAN_WINDOW_BYTES, line numbers come
+    from counting newlines in those windows, and only candidate lines are
+    decoded and matched. Buffers whose lines could differ once decoded
+    (non-ASCII, lone CR) are decoded whole and go through scan_content.
+    """
+    rules = scan_rules(language)
+    if rules.unanchored is not None or TEXT_ONLY_BYTES_RE.search(buf):
+        return scan_content(decode_text(bytes(buf)), language=language, budget=budget)
+
+    found: Tuple[list, list, list] = ([], [], [])
+    if rules.bytes_keywords is None:
+        return format_findings(*found)
+
+    size = len(buf)
+    overlap = rules.max_keyword - 1
+    window_start = 0
+    window_line = 1       # line number at window_start
+    line_end = -1         # end of the last candidate line
+    while window_start < size:
+        window_end = min(window_start + SCAN_WINDOW_BYTES, size)
+        folded = bytes(buf[window_start:window_end + overlap]).lower()
+        limit = window_end - window_start
+        counted, line_num = 0, window_line
+        # Resume after the line of each hit; the line's other keywords change nothing
+        local = max(0, line_end + 1 - window_start)
+        while local < limit:
+            if budget is not None and budget.expired():
+                break
+            m = rules.bytes_keywords.search(folded, local)
+            if not m or m.start() >= limit:
+                break
+            local = m.start()
+            pos = window_start + local
+            line_num += folded.count(b"\n", counted, local)
+            counted = local
+            line_start = buf.rfind(b"\n", 0, pos) + 1
+            line_end = buf.find(b"\n", pos)
+            if line_end == -1:
+                line_end = size
+            local = line_end + 1 - window_start
+            line = buf[line_start:line_end].rstrip(b"\r").decode("ascii")
+            if line.strip().startswith(COMMENT_PREFIXES):
+                continue
+            match_line((rules.secrets, rules.telemetry, rules.network), line_num, line, line.lower(), found, budget)
+        window_line += folded.count(b"\n", 0, limit)
+        window_start = window_end
 
-        try:
-            rel_parts = f.relative_to(repo_path).parts
-            if not rel_parts or rel_parts[0] not in content_dirs:
+    return format_findings(*found)
+
+
+def token_entropy(token: str) -> float:
+    """
+    Shannon entropy of a token in bits per character. Symbol counts come from one
+    pass over the token (Counter counts in C) and c*log2(c) from a table, so no
+    per-character Python loop is involved.
+    """
+    n = len(token)
+    return math.log2(n) - sum(map(NLOG2N.__getitem__, Counter(token).values())) / n
+
+
+def secret_tokens(content) -> Tuple[Any, List[Tuple[int, int]]]:
+    """
+    Find the secret-shaped tokens of decoded text or a byte buffer.
+    Returns (data, spans): the content as bytes (a buffer is used as is and
+    classified SCAN_WINDOW_BYTES at a time, never copied whole), one byte per
+    character either way so offsets and line numbers agree, and the
+    (start, end) of every token run of LEAKED_MIN_LENGTH to ENTROPY_MAX_LENGTH
+    characters.
+    """
+    data = content.encode("ascii", errors="replace") if isinstance(content, str) else content
+    needle = b"t" * LEAKED_MIN_LENGTH
+    spans: List[Tuple[int, int]] = []
+    open_start: Optional[int] = None  # start of a run reaching the end of the previous window
+
+    def close(start: int, end: int) -> None:
+        if LEAKED_MIN_LENGTH <= end - start <= ENTROPY_MAX_LENGTH:
+            spans.append((start, end))
+
+    for pos in range(0, len(data), SCAN_WINDOW_BYTES):
+        runs = data[pos:pos + SCAN_WINDOW_BYTES].translate(SECRET_TOKEN_TABLE)
+        i = 0
+        if open_start is not None:
+            i = runs.find(b" ")
+            if i == -1:
+                continue  # the run goes on through this whole window
+            close(open_start, pos + i)
+            open_start = None
+        # The first LEAKED_MIN_LENGTH token characters found always start a run
+        start = runs.find(needle, i)
+        while start != -1:
+            end = runs.find(b" ", start + LEAKED_MIN_LENGTH)
+            if end == -1:
+                break
+            close(pos + start, pos + end)
+            start = runs.find(needle, end)
+        tail = runs.rfind(b" ") + 1
+        if tail < len(runs):
+            open_start = pos + tail
+    if open_start is not None:
+        close(open_start, len(data))
+    return data, spans
+
+
+def count_line_breaks(data, start: int, end: int) -> int:
+    """LF, CRLF and lone CR line breaks in data[start:end], counted SCAN_WINDOW_BYTES at a time."""
+    total = 0
+    for pos in range(start, end, SCAN_WINDOW_BYTES):
+        stop = min(pos + SCAN_WINDOW_BYTES, end)
+        window = data[pos:stop]
+        total += window.count(b"\n") + window.count(b"\r") - window.count(b"\r\n")
+        if stop < end and window.endswith(b"\r") and data[stop] == 0x0A:
+            total -= 1  # a CRLF split between windows
+    return total
+
+
+def numbered_offsets(data, offsets: List[int]):
+    """
+    Yield (offset, line number, line start) for increasing offsets, counting
+    line breaks the way decode_text does: LF, CRLF and a lone CR.
+    """
+    line_num, counted, line_start = 1, 0, 0
+    for offset in offsets:
+        line_num += count_line_breaks(data, counted, offset)
+        counted = offset
+        # Look back no further than the previous line start, or a file without CR is rescanned per offset
+        found = max(data.rfind(b"\n", line_start, offset), data.rfind(b"\r", line_start, offset))
+        if found != -1:
+            line_start = found + 1
+        yield offset, line_num, line_start
+
+
+def entropy_findings(
+    content,
+    tokens: Optional[Tuple[bytes, List[Tuple[int, int]]]] = None
+) -> List[Tuple[int, str, int, float, float]]:
+    """
+    Random-looking tokens in decoded text or a byte buffer, scored in one batch.
+    A token's score is its entropy over the most its length and alphabet allow.
+    Only tokens reaching the lowest tier threshold for their alphabet are kept;
+    hex runs of a digest length and tokens on comment lines are skipped.
+    `tokens` is secret_tokens(content), when already computed.
+    Returns (line, alphabet, length, entropy, score) findings.
+    """
+    data, spans = tokens or secret_tokens(content)
+    floors = {
+        alphabet: min(thresholds[alphabet] for thresholds in ENTROPY_THRESHOLDS.values())
+        for alphabet in ("hex", "base64")
+    }
+
+    candidates: Dict[int, Tuple[str, int, float, float]] = {}  # offset -> (alphabet, length, entropy, score)
+    for start, end in spans:
+        if end - start < ENTROPY_MIN_LENGTH:
+            continue
+        token = data[start:end].decode("ascii")
+        if (token.startswith(INTEGRITY_PREFIXES) or not DIGIT_RE.search(token)
+                or any(seq in token for seq in ENTROPY_SEQUENCES)):
+            continue
+        if HEX_TOKEN_RE.fullmatch(token):
+            if token.isdigit() or len(token) in HEX_DIGEST_LENGTHS:
                 continue
-        except ValueError:
+            alphabet, token, symbols = "hex", token.lower(), HEX_ALPHABET
+        elif token != token.lower() and token != token.upper() and not ENTROPY_WORD_RE.search(token):
+            alphabet, symbols = "base64", BASE64_ALPHABET
+        else:
+            continue
+        entropy = token_entropy(token)
+        score = entropy / math.log2(min(len(token), len(symbols)))
+        if score >= floors[alphabet]:
+            candidates[start] = (alphabet, len(token), entropy, score)
+
+    found: List[Tuple[int, str, float, float]] = []
+    comment_prefixes = tuple(p.encode("ascii") for p in COMMENT_PREFIXES)
+    for offset, line_num, line_start in numbered_offsets(data, sorted(candidates)):
+        prefix = data[line_start:offset]
+        if prefix.lstrip().startswith(comment_prefixes) or URL_PREFIX_RE.search(prefix):
             continue
+        alphabet, length, entropy, score = candidates[offset]
+        found.append((line_num, alphabet, length, round(entropy, 2), round(score, 2)))
+    return found
 
-        try:
-            content = f.read_text(encoding="utf-8", errors="ignore")
-            rel = f.relative_to(repo_path)
 
-            # Check for secrets (HARD FAIL for all tiers)
-            secret_findings = scan_file_for_secrets(f, content)
-            for line_num, name, matched in secret_findings:
-                errors.append(
-                    f"SECURITY: Hardcoded secret detected & rejected by validator in {rel}:{line_num} - {name}"
-                )
+def leaked_credential_findings(
+    content,
+    tokens: Optional[Tuple[bytes, List[Tuple[int, int]]]] = None
+) -> List[Tuple[int, str, str]]:
+    """
+    Tokens whose SHA-256 digest is on the leaked credential blocklist, with or
+    without base64 padding. Comment lines are not exempt: an exact match is a
+    leak wherever it sits. `tokens` is secret_tokens(content), when already computed.
+    Returns (line, rule name, matched) findings like the secret rules.
+    """
+    blocklist = leaked_filter()
+    if blocklist is None:
+        return []
+    data, spans = tokens or secret_tokens(content)
+    hits: Dict[int, bytes] = {}
+    for start, end in spans:
+        padded = end
+        while padded < len(data) and padded - end < 2 and data[padded] == 0x3D:  # "="
+            padded += 1
+        for token in {data[start:end], data[start:padded]}:
+            if hashlib.sha256(token).digest() in blocklist:
+                hits[start] = token
+    return [
+        (line_num, "Known leaked credential", hits[offset].decode("ascii"))
+        for offset, line_num, _ in numbered_offsets(data, sorted(hits))
+    ]
+
+
+def scan_file_for_secrets(file_path: Path, content: str) -> List[Tuple[int, str, str]]:
+    """Scan file content for hardcoded secrets, including known leaked credentials."""
+    return scan_content(content)[0] + leaked_credential_findings(content)
+
+
+def scan_file_for_network(file_path: Path, content: str) -> List[Tuple[int, str, str]]:
+    """Scan file content for network/telemetry code."""
+    return [(n, name, matched) for n, name, matched, _ in scan_content(content)[2]]
+
+
+def scan_file_for_telemetry(file_path: Path, content: str) -> List[Tuple[int, str, str]]:
+    """Scan specifically for telemetry/analytics (always blocked)."""
+    return scan_content(content)[1]
+
+
+def scan_file_content(content, language: Optional[str] = None) -> dict:
+    """
+    Run the secret, telemetry and network checks for a language on file content:
+    decoded text, or a byte buffer scanned without decoding. The result depends
+    on the content alone (no path, no tier), so it can be cached by blob id.
+    Minified/generated content (judged from its head) is scanned with
+    scan_minified, and each rule's findings are collapsed when reported.
+    A failed scan is reported in "error" rather than raised.
+    """
+    scan = {"language": language, "secrets": [], "telemetry": [], "network": [], "entropy": [],
+            "network_detected": False, "minified": False, "partial": [], "error": None}
+    budget = ScanBudget()
+    try:
+        scan["minified"] = looks_minified(content[:MAX_READ_BYTES_FOR_BINARY_CHECK])
+        if scan["minified"]:
+            text = content if isinstance(content, str) else decode_text(bytes(content))
+            secret_findings, telemetry_findings, network_findings = scan_minified(text, language, budget)
+        elif isinstance(content, str):
+            secret_findings, telemetry_findings, network_findings = scan_content(
+                content, language=language, budget=budget
+            )
+        else:
+            secret_findings, telemetry_findings, network_findings = scan_buffer(content, language, budget)
+        scan["partial"] = budget.shortfall()
+        tokens = secret_tokens(content)
+        scan["secrets"] = [
+            [line_num, name]
+            for line_num, name, _ in secret_findings + leaked_credential_findings(content, tokens)
+        ]
+        # Scores only; the tokens themselves are never stored
+        scan["entropy"] = [list(finding) for finding in entropy_findings(content, tokens)]
+        scan["telemetry"] = [[line_num, name] for line_num, name, _ in telemetry_findings]
+        scan["network_detected"] = bool(network_findings)
+
+        telemetry_rules = scan_rules(language).telemetry
+        for line_num, name, matched, line in network_findings:
+            # Skip if it's a telemetry finding (reported as telemetry)
+            if any(regex.search(matched) for regex, _, _ in telemetry_rules):
+                continue
+            # Try to extract domains from URLs in the line
+            url_match = URL_DOMAIN_RE.search(line)
+            scan["network"].append([line_num, name, url_match.group(1) if url_match else None])
+    except Exception as e:
+        scan["error"] = str(e)
+    return scan
+
+
+def collapse_findings(entries: list, minified: bool, key=lambda entry: entry[1]) -> List[Tuple[list, str]]:
+    """
+    Pair each finding with the note to report it with. Findings of minified
+    code are collapsed to the first per key (rule name by default), noted
+    with how many there were.
+    """
+    if not minified:
+        return [(entry, "") for entry in entries]
+    groups: Dict[str, list] = {}
+    for entry in entries:
+        group = groups.setdefault(key(entry), [entry, 0])
+        group[1] += 1
+    return [
+        (entry, f" ({count} occurrence{'s' if count != 1 else ''} in minified/generated code)")
+        for entry, count in groups.values()
+    ]
+
+
+def findings_from_scan(rel: str, tier: str, scan: dict, base: Optional[FileFindings] = None) -> FileFindings:
+    """Turn a content scan into the errors and warnings for a file at rel in a plugin of tier."""
+    findings = replace(base or FileFindings(), scanned=True, errors=[], warnings=[],
+                       network_detected=scan["network_detected"])
+    errors = findings.errors
+    warnings = findings.warnings
+    detected_domains: Set[str] = set()
+    minified = scan["minified"]
+
+    if scan["error"] is not None:
+        warnings.append(f"Could not security scan {rel}: {scan['error']}")
+    # A file built to be slow must not hide a secret behind a warning (curated: HARD FAIL)
+    if scan["partial"] and tier == "curated":
+        errors.append(
+            f"SECURITY: Scan budget exhausted & rejected by validator in {rel}: {'; '.join(scan['partial'])}"
+        )
+    elif scan["partial"]:
+        warnings.append(f"Partially scanned {rel}: {'; '.join(scan['partial'])} (review manually)")
+
+    # Check for secrets (HARD FAIL for all tiers)
+    for (line_num, name), note in collapse_findings(scan["secrets"], minified):
+        errors.append(
+            f"SECURITY: Hardcoded secret detected & rejected by validator in {rel}:{line_num} - {name}{note}"
+        )
 
-            # Check for telemetry (HARD FAIL for all tiers)
-            telemetry_findings = scan_file_for_telemetry(f, content)
-            for line_num, name, matched in telemetry_findings:
+    # Check for random-looking tokens (curated: HARD FAIL for long base64 tokens, otherwise warn)
+    thresholds = ENTROPY_THRESHOLDS.get(tier, ENTROPY_THRESHOLDS["community"])
+    if rel.rsplit("/", 1)[-1] not in LOCKFILE_NAMES:
+        tokens = [finding for finding in scan["entropy"] if finding[4] >= thresholds[finding[1]]]
+        for (line_num, alphabet, length, entropy, _), note in collapse_findings(tokens, minified):
+            if tier == "curated" and alphabet == "base64" and length >= ENTROPY_REJECT_MIN_LENGTH:
                 errors.append(
-                    f"SECURITY: Telemetry/analytics detected & rejected by validator in {rel}:{line_num} - {name}"
+                    f"SECURITY: High-entropy string (possible secret) detected & rejected by validator "
+                    f"in {rel}:{line_num} - {alphabet} token, {entropy:.2f} bits/char{note}"
                 )
+            else:
+                warnings.append(
+                    f"High-entropy string (possible secret) in {rel}:{line_num} - {alphabet} token, "
+                    f"{entropy:.2f} bits/char{note}. Ensure it is not a credential."
+                )
+
+    # Check for telemetry (HARD FAIL for all tiers)
+    for (line_num, name), note in collapse_findings(scan["telemetry"], minified):
+        errors.append(
+            f"SECURITY: Telemetry/analytics detected & rejected by validator in {rel}:{line_num} - {name}{note}"
+        )
 
-            # Check for network code
-            network_findings = scan_file_for_network(f, content)
-            if network_findings:
-                network_detected = True
+    # Check for network code
+    for (line_num, name, _), note in collapse_findings(scan["network"], minified):
+        if tier == "curated":
+            # Curated: all network code is banned
+            errors.append(
+                f"SECURITY: Network code detected & rejected by validator in {rel}:{line_num} - {name}{note}. "
+                f"Curated plugins must not use network. Remove network code or move to community tier."
+            )
+        else:
+            # Community: warn but allow if domains declared
+            warnings.append(
+                f"Network code in {rel}:{line_num} - {name}{note}. "
+                f"Ensure all accessed domains are declared in manifest."
+            )
+    # Every occurrence counts towards the domains, collapsed or not
+    detected_domains.update(domain for _, _, domain in scan["network"] if domain)
 
-                for line_num, name, matched in network_findings:
-                    # Skip if it's a telemetry finding (already handled above)
-                    is_telemetry = any(
-                        re.search(tp[0], matched) for tp in TELEMETRY_PATTERNS
-                    )
-                    if is_telemetry:
+    findings.detected_domains = sorted(detected_domains)
+    return findings
+
+
+def scan_file_security(rel: str, content, tier: str, language: Optional[str] = None) -> FileFindings:
+    """Scan one file's content and report its findings as the file at rel."""
+    return findings_from_scan(rel, tier, scan_file_content(content, language))
+
+
+def shebang_language(data: bytes) -> Optional[str]:
+    """Language of a script from its #! line, e.g. '#!/usr/bin/env python3' -> 'python'."""
+    if data[:2] != b"#!":
+        return None
+    end = data.find(b"\n", 0, 4096)
+    words = data[2:end if end != -1 else 4096].decode("utf-8", errors="ignore").split()
+    if not words:
+        return None
+    program = os.path.basename(words[0])
+    if program == "env":
+        args = [w for w in words[1:] if not w.startswith("-") and "=" not in w]
+        program = args[0] if args else ""
+    m = re.match(r"[a-z]+", program)
+    return SHEBANG_LANGUAGES.get(m.group(0)) if m else None
+
+
+# =========================
+# LEAKED CREDENTIALS
+# =========================
+
+# LEAKED_CREDENTIALS_FILE lists SHA-256 digests of known-compromised tokens. It
+# is compiled once into a Bloom filter followed by the sorted digests, cached
+# under LEAKED_FILTER_DIR and memory-mapped, so loading costs the same for a
+# million entries as for ten and a miss never touches the digest table.
+LEAKED_FILTER_MAGIC = b"LEAKBF01"
+LEAKED_FILTER_HEADER = struct.Struct("<8s32sQIQ")  # magic, source digest, m bits, k, n digests
+
+_leaked_filter: Any = False  # False: not loaded yet; None: no blocklist
+_leaked_filter_lock = threading.Lock()
+
+
+class LeakedCredentialFilter:
+    """A compiled blocklist: `digest in filter` is a Bloom test, verified exactly on a hit."""
+
+    def __init__(self, path: Path):
+        with path.open("rb") as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, source_digest, self._m, self._k, self._n = LEAKED_FILTER_HEADER.unpack_from(self._buf)
+        if magic != LEAKED_FILTER_MAGIC:
+            raise ValueError(f"Not a leaked credential filter: {path}")
+        self.source_digest = source_digest.hex()
+        self.count = self._n
+        self._bits = LEAKED_FILTER_HEADER.size
+        self._digests = self._bits + self._m // 8
+
+    def __contains__(self, digest: bytes) -> bool:
+        # Double hashing on the digest itself: it is already uniformly random
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        for i in range(self._k):
+            bit = (h1 + i * h2) % self._m
+            if not self._buf[self._bits + (bit >> 3)] >> (bit & 7) & 1:
+                return False
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = self._digests + mid * 32
+            probe = self._buf[pos:pos + 32]
+            if probe == digest:
+                return True
+            if probe < digest:
+                lo = mid + 1
+            else:
+                hi = mid
+        return False
+
+
+def read_leaked_digests(path: Path) -> List[bytes]:
+    """Parse the blocklist: one SHA-256 hex digest per line; blank lines and # comments ignored."""
+    digests: Set[bytes] = set()
+    with path.open("r", encoding="utf-8") as f:
+        for line_num, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if not re.fullmatch(r"[0-9a-fA-F]{64}", line):
+                raise ValueError(f"{path}:{line_num}: expected a SHA-256 hex digest")
+            digests.add(bytes.fromhex(line))
+    return sorted(digests)
+
+
+def build_leaked_filter(digests: List[bytes], source_digest: bytes, dest: Path) -> None:
+    """Write a filter for sorted, unique digests sized for LEAKED_FALSE_POSITIVE_RATE."""
+    n = len(digests)
+    m = max(64, math.ceil(-n * math.log(LEAKED_FALSE_POSITIVE_RATE) / math.log(2) ** 2))
+    m += -m % 8
+    k = max(1, round(m / max(1, n) * math.log(2)))
+    bits = bytearray(m // 8)
+    for digest in digests:
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        for i in range(k):
+            bit = (h1 + i * h2) % m
+            bits[bit >> 3] |= 1 << (bit & 7)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f"{dest.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with tmp.open("wb") as f:
+        f.write(LEAKED_FILTER_HEADER.pack(LEAKED_FILTER_MAGIC, source_digest, m, k, n))
+        f.write(bits)
+        f.write(b"".join(digests))
+    os.replace(tmp, dest)
+
+
+def leaked_filter_path() -> Optional[Path]:
+    """
+    The compiled filter for the current LEAKED_CREDENTIALS_FILE, built if needed.
+    Filters are named by the source's digest; an index of the source's size and
+    mtime spares rehashing it while it is untouched. None when there is no blocklist.
+    """
+    try:
+        st = LEAKED_CREDENTIALS_FILE.stat()
+    except OSError:
+        return None
+    stamp = [st.st_size, st.st_mtime_ns]
+    index_path = LEAKED_FILTER_DIR / "index.json"
+    try:
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        index = {}
+    if index.get("stamp") == stamp:
+        path = LEAKED_FILTER_DIR / f"{index['digest']}.bloom"
+        if path.exists():
+            return path
+
+    source_digest = hashlib.sha256(LEAKED_CREDENTIALS_FILE.read_bytes()).digest()
+    path = LEAKED_FILTER_DIR / f"{source_digest.hex()}.bloom"
+    if not path.exists():
+        digests = read_leaked_digests(LEAKED_CREDENTIALS_FILE)
+        if not digests:
+            return None
+        build_leaked_filter(digests, source_digest, path)
+        for stale in LEAKED_FILTER_DIR.glob("*.bloom"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+    tmp = index_path.with_name(f"index.json.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps({"stamp": stamp, "digest": source_digest.hex()}), encoding="utf-8")
+    os.replace(tmp, index_path)
+    return path
+
+
+def leaked_filter() -> Optional[LeakedCredentialFilter]:
+    """The compiled blocklist, loaded once per process; None when there is none."""
+    global _leaked_filter
+    with _leaked_filter_lock:
+        if _leaked_filter is False:
+            path = leaked_filter_path()
+            _leaked_filter = LeakedCredentialFilter(path) if path else None
+        return _leaked_filter
+
+
+# =========================
+# FILE SCAN POOL
+# =========================
+
+SCAN_POOL_MIN_BYTES = 4 * 1024 * 1024  # below this, worker startup outweighs the scan
+SCAN_BATCH_BYTES = 1024 * 1024         # content per batch handed to a worker
+
+_scan_workers = 1
+_scan_pool: Optional[ProcessPoolExecutor] = None
+_scan_pool_lock = threading.Lock()
+
+
+def resolve_scan_workers(value: str) -> int:
+    """Translate a --scan-workers value ('auto' or a positive integer) into a process count."""
+    if value == "auto":
+        return os.cpu_count() or 1
+    try:
+        workers = int(value)
+    except ValueError:
+        raise ValueError(f"--scan-workers must be a positive integer or 'auto', got '{value}'")
+    if workers < 1:
+        raise ValueError(f"--scan-workers must be a positive integer or 'auto', got '{value}'")
+    return workers
+
+
+def configure_scan_pool(workers: int) -> None:
+    """Set how many processes file scanning may use; 1 keeps it in-process."""
+    global _scan_workers
+    shutdown_scan_pool()
+    _scan_workers = workers
+
+
+def shutdown_scan_pool() -> None:
+    global _scan_pool
+    with _scan_pool_lock:
+        if _scan_pool is not None:
+            _scan_pool.shutdown()
+            _scan_pool = None
+
+
+def scan_pool() -> ProcessPoolExecutor:
+    """The shared worker pool, started on first use ('spawn': plugin threads may be running)."""
+    global _scan_pool
+    with _scan_pool_lock:
+        if _scan_pool is None:
+            _scan_pool = ProcessPoolExecutor(
+                max_workers=_scan_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _scan_pool
+
+
+def scan_file_batch(batch: List[Tuple[str, Union[bytes, Path], Optional[str]]]) -> List[Optional[dict]]:
+    """
+    Scan (path, scan input, language) items; a None language is sniffed from the shebang.
+    Returns a content scan per item, None for files that turn out not to be scripts.
+    """
+    results: List[Optional[dict]] = []
+    for rel, data, language in batch:
+        try:
+            with open_scan_buffer(data) as buf:
+                if language is None:
+                    language = shebang_language(buf)
+                    if language is None:
+                        results.append(None)
                         continue
+                results.append(scan_file_content(buf, language))
+        except OSError as e:
+            scan = scan_file_content("", language)
+            scan["error"] = str(e)
+            results.append(scan)
+    return results
 
-                    if tier == "curated":
-                        # Curated: all network code is banned
-                        errors.append(
-                            f"SECURITY: Network code detected & rejected by validator in {rel}:{line_num} - {name}. "
-                            f"Curated plugins must not use network. Remove network code or move to community tier."
-                        )
-                    else:
-                        # Community: warn but allow if domains declared
-                        warnings.append(
-                            f"Network code in {rel}:{line_num} - {name}. "
-                            f"Ensure all accessed domains are declared in manifest."
-                        )
 
-                    # Try to extract domains from URLs in the line
-                    url_match = re.search(r'https?://([^/\s\'"]+)', content.split("\n")[line_num - 1])
-                    if url_match:
-                        detected_domains.add(url_match.group(1))
+def scan_file_batches(pending: List[Tuple[str, Union[bytes, Path], Optional[str]]]) -> List[Optional[dict]]:
+    """
+    Scan files in-process, or in batches on the worker pool when there is enough
+    content to pay for it. Results come back in the order of `pending`.
+    """
+    sizes = [scan_input_size(data) for _, data, _ in pending]
+    if _scan_workers <= 1 or sum(sizes) < SCAN_POOL_MIN_BYTES:
+        return scan_file_batch(pending)
+
+    batches: List[List[Tuple[str, Union[bytes, Path], Optional[str]]]] = [[]]
+    batch_bytes = 0
+    for item, size in zip(pending, sizes):
+        if batch_bytes >= SCAN_BATCH_BYTES:
+            batches.append([])
+            batch_bytes = 0
+        batches[-1].append(item)
+        batch_bytes += size
+
+    results: List[Optional[dict]] = []
+    for batch_results in scan_pool().map(scan_file_batch, batches):
+        results.extend(batch_results)
+    return results
+
 
+def security_scan_repo(
+    source,
+    tier: str,
+    allowed_domains: Set[str],
+    findings: Optional[Dict[str, FileFindings]] = None
+) -> Tuple[List[str], List[str], bool, Set[str]]:
+    """
+    Scan a plugin source (working tree or git tree) for security issues.
+    Files already scanned in `findings` (e.g. carried forward from the last
+    validated commit) are not read again; newly scanned files are added to it.
+    Blobs scanned before, in any plugin, come from the blob scan cache.
+    Returns (errors, warnings, network_detected, detected_domains).
+    """
+    errors: List[str] = []
+    warnings: List[str] = []
+    network_detected = False
+    detected_domains: Set[str] = set()
+    if findings is None:
+        findings = {}
+
+    content_dirs = {"commands", "hooks", "agents", "skills"}
+
+    scannable: List[str] = []
+    pending: List[Tuple[str, Union[bytes, Path], Optional[str]]] = []
+    oids: Dict[str, Optional[str]] = {}
+    read_errors: Dict[str, str] = {}
+    for entry in source.files:
+        rel = entry.path
+        if entry.top_dir not in content_dirs:
+            continue
+
+        language = LANGUAGE_BY_EXTENSION.get(entry.ext)
+        if language is None and (entry.ext or entry.top_dir not in SHEBANG_DIRS):
+            continue
+
+        scannable.append(rel)
+        file_findings = findings.setdefault(rel, FileFindings())
+        if language is None and file_findings.binary is not None:
+            # Head already sniffed: no need to read the file to find its shebang
+            language = file_findings.interpreter
+            if language is None:
+                file_findings.scanned = True
+        if file_findings.scanned:
+            continue
+        scan = cached_blob_scan(entry.oid, language) if entry.oid and language else None
+        if scan is not None:
+            findings[rel] = findings_from_scan(rel, tier, scan, file_findings)
+            continue
+        try:
+            pending.append((rel, source.scan_input(rel), language))
+            oids[rel] = entry.oid
         except Exception as e:
-            warnings.append(f"Could not security scan {f.relative_to(repo_path)}: {e}")
+            read_errors[rel] = f"Could not security scan {rel}: {e}"
+
+    # Blobs are read here (the git source is a single pipe); scanning may fan out
+    for (rel, _, _), scan in zip(pending, scan_file_batches(pending)):
+        if scan is None:
+            # Not a script after all; nothing to carry but the verdict
+            findings[rel] = replace(findings[rel], scanned=True)
+            continue
+        # Errors and time-budget shortfalls depend on the run, not the content
+        if oids[rel] and scan["error"] is None and not scan["partial"]:
+            store_blob_record(oids[rel], scan=scan)
+        findings[rel] = findings_from_scan(rel, tier, scan, findings[rel])
+
+    for rel in scannable:
+        if rel in read_errors:
+            warnings.append(read_errors[rel])
+            continue
+        file_findings = findings[rel]
+        errors.extend(file_findings.errors)
+        warnings.extend(file_findings.warnings)
+        network_detected = network_detected or file_findings.network_detected
+        detected_domains.update(file_findings.detected_domains)
 
     return errors, warnings, network_detected, detected_domains
 
@@ -871,217 +2700,1304 @@ def check_consistency(
 # PLUGIN REPO VALIDATION
 # =========================
 
-def extract_command_names(repo_path: Path) -> Set[str]:
+def sniff_file(source, entry: RepoFile, findings: FileFindings) -> None:
+    """
+    Classify a file from one read of its head: binary ratio, magic number and
+    shebang. Blobs classified before are taken from the blob scan cache.
+    """
+    blob = load_blob_record(entry.oid) if entry.oid else None
+    if blob and "sniff" in blob:
+        findings.binary, findings.kind, findings.interpreter = blob["sniff"]
+        return
+    try:
+        head = source.read(entry.path, MAX_READ_BYTES_FOR_BINARY_CHECK)
+    except Exception:
+        findings.binary = True
+        return
+    findings.binary = is_probably_binary_data(head)
+    findings.kind = detect_magic(head)
+    findings.interpreter = shebang_language(head)
+    if entry.oid:
+        store_blob_record(entry.oid, sniff=[findings.binary, findings.kind, findings.interpreter])
+
+
+def extract_command_names(source) -> Set[str]:
     """Extract command names from commands directory."""
     cmds: Set[str] = set()
-    cmd_dir = repo_path / "commands"
-    if not cmd_dir.exists() or not cmd_dir.is_dir():
-        return cmds
-
-    for f in cmd_dir.rglob("*"):
-        if f.is_file() and f.suffix.lower() in {".md", ".txt"}:
-            cmds.add(f.stem.strip())
+    for entry in source.files:
+        if entry.top_dir == "commands" and entry.ext in {".md", ".txt"}:
+            cmds.add(Path(entry.path).stem.strip())
     return cmds
 
 
-def validate_plugin_repo(
-    repo_path: Path,
-    tier: str
-) -> Tuple[List[str], List[str], Set[str], Optional[dict], bool, Set[str]]:
+# Stages of a plugin's validation, cheapest first. With fail-fast, a plugin
+# stops at the first stage reporting errors; the rest are never run.
+VALIDATION_STAGES = ("entry", "manifest", "policy", "inventory", "content", "cve")
+
+_fail_fast = False
+
+
+def configure_fail_fast(enabled: bool) -> None:
+    global _fail_fast
+    _fail_fast = enabled
+
+
+def fail_fast_note(stage: str) -> str:
+    """Warning recorded on a plugin whose validation stopped at a failing stage."""
+    return (f"Fail-fast: stopped after the {stage} stage failed; later stages were not run "
+            f"(use --full for every finding)")
+
+
+def check_manifest(source, tier: str) -> Tuple[List[str], List[str], Optional[str], Optional[dict]]:
     """
-    Validate a cloned plugin repository.
-    Returns (errors, warnings, commands, manifest, network_detected, detected_domains).
+    Manifest stage: required files and dirs, manifest JSON and schema.
+    Returns (errors, warnings, manifest path, manifest data).
     """
     errors: List[str] = []
     warnings: List[str] = []
     manifest_data: Optional[dict] = None
 
     # Required: manifest exists
-    manifest = exists_any(repo_path, POSSIBLE_PLUGIN_MANIFESTS)
+    manifest = exists_any(source, POSSIBLE_PLUGIN_MANIFESTS)
     if not manifest:
         errors.append(f"Missing plugin manifest (expected one of: {POSSIBLE_PLUGIN_MANIFESTS})")
 
     # Required: README + LICENSE
     for f in REQUIRED_FILES:
-        if not (repo_path / f).exists():
+        if not source.exists(f):
             errors.append(f"Missing required file: {f}")
 
     # Required: content dirs
-    has_content = any((repo_path / d).exists() for d in POSSIBLE_CONTENT_DIRS)
+    has_content = any(source.exists(d) for d in POSSIBLE_CONTENT_DIRS)
     if not has_content:
         errors.append(f"No content dirs found (expected one of: {POSSIBLE_CONTENT_DIRS})")
 
     # Parse and validate manifest
-    allowed_domains: Set[str] = set()
-    is_legacy = False
     if manifest:
         try:
-            manifest_data = json.loads((repo_path / manifest).read_text(encoding="utf-8"))
+            manifest_data = json.loads(source.read(manifest).decode("utf-8"))
 
             # Validate manifest schema (returns errors, warnings)
             schema_errors, schema_warnings = validate_plugin_manifest_schema(manifest_data, tier)
             errors.extend(schema_errors)
             warnings.extend(schema_warnings)
 
-            # Check if legacy manifest
-            is_legacy = "policyTier" not in manifest_data or "capabilities" not in manifest_data
-
-            # Validate tier policy
-            policy_errors = validate_tier_policy(manifest_data, tier, is_legacy)
-            errors.extend(policy_errors)
-
-            # Extract allowed domains for security scanning
-            caps = manifest_data.get("capabilities", {})
-            if caps:
-                network = caps.get("network", {})
-                allowed_domains = set(network.get("domains", []))
-
         except json.JSONDecodeError as e:
             errors.append(f"Invalid JSON in {manifest}: {e}")
         except Exception as e:
             errors.append(f"Error reading {manifest}: {e}")
 
+    return errors, warnings, manifest, manifest_data
+
+
+def check_policy(manifest: Optional[str], manifest_data: Optional[dict], tier: str) -> Tuple[List[str], Set[str]]:
+    """Tier policy stage, for a parsed manifest. Returns (errors, allowed_domains)."""
+    errors: List[str] = []
+    allowed_domains: Set[str] = set()
+    if manifest_data is None:
+        return errors, allowed_domains
+    try:
+        # Check if legacy manifest
+        is_legacy = "policyTier" not in manifest_data or "capabilities" not in manifest_data
+
+        # Validate tier policy
+        errors.extend(validate_tier_policy(manifest_data, tier, is_legacy))
+
+        # Extract allowed domains for security scanning
+        caps = manifest_data.get("capabilities", {})
+        if caps:
+            network = caps.get("network", {})
+            allowed_domains = set(network.get("domains", []))
+
+    except Exception as e:
+        errors.append(f"Error reading {manifest}: {e}")
+    return errors, allowed_domains
+
+
+def check_inventory(source, findings: Dict[str, FileFindings]) -> Tuple[List[str], List[str]]:
+    """Inventory stage: file count, sizes, types and binary sniffing. Returns (errors, warnings)."""
+    errors: List[str] = []
+    warnings: List[str] = []
+
     # Deep scan: file sizes, binaries, repo size
-    files = walk_repo_files(repo_path)
+    files = source.files
 
-    if len(files) > MAX_FILES_COUNT:
-        errors.append(f"Repo contains too many files: {len(files)} > {MAX_FILES_COUNT}")
+    if source.limit_error:
+        # The inventory stopped early, so the totals below would undercount
+        errors.append(source.limit_error)
+    else:
+        if len(files) > MAX_FILES_COUNT:
+            errors.append(f"Repo contains too many files: {len(files)} > {MAX_FILES_COUNT}")
 
-    repo_size = get_repo_size_bytes(files)
-    if repo_size > MAX_REPO_SIZE_BYTES:
-        errors.append(
-            f"Repo too large: {repo_size/1024/1024:.2f}MB > {MAX_REPO_SIZE_BYTES/1024/1024:.2f}MB"
-        )
+        repo_size = sum(f.size for f in files)
+        if repo_size > MAX_REPO_SIZE_BYTES:
+            errors.append(
+                f"Repo too large: {repo_size/1024/1024:.2f}MB > {MAX_REPO_SIZE_BYTES/1024/1024:.2f}MB"
+            )
 
     for f in files:
+        rel = f.path
         try:
-            if f.is_symlink():
-                warnings.append(f"Symlink detected: {f.relative_to(repo_path)} (review manually)")
+            if f.is_symlink:
+                warnings.append(f"Symlink detected: {rel} (review manually)")
                 continue
 
-            size = f.stat().st_size
-            rel = f.relative_to(repo_path)
+            size = f.size
 
             if size > MAX_FILE_SIZE_BYTES:
                 errors.append(
                     f"File too large: {rel} ({size/1024/1024:.2f}MB) > {MAX_FILE_SIZE_BYTES/1024/1024:.2f}MB"
                 )
 
-            ext = f.suffix.lower()
+            ext = f.ext
 
             if ext in DISALLOWED_EXTENSIONS:
                 errors.append(f"Disallowed file type in repo: {rel} ({ext})")
 
-            if ext not in TEXT_EXTENSIONS and size > 0:
-                if is_probably_binary(f):
+            if size > 0:
+                file_findings = findings.setdefault(rel, FileFindings())
+                if file_findings.binary is None:
+                    sniff_file(source, f, file_findings)
+                if file_findings.kind:
+                    errors.append(f"Binary/suspicious file detected: {rel} ({file_findings.kind})")
+                elif ext not in TEXT_EXTENSIONS and file_findings.binary:
                     errors.append(f"Binary/suspicious file detected: {rel}")
 
         except Exception as e:
-            warnings.append(f"Could not inspect file: {f} ({e})")
+            warnings.append(f"Could not inspect file: {rel} ({e})")
+
+    return errors, warnings
+
+
+def validate_plugin_source(
+    source,
+    tier: str,
+    findings: Optional[Dict[str, FileFindings]] = None,
+    fail_fast: bool = False
+) -> Tuple[List[str], List[str], Set[str], Optional[dict], bool, Set[str]]:
+    """
+    Validate a plugin from any source exposing files/exists/read
+    (WorkingTreeSource or GitTreeSource), stage by stage: manifest, tier
+    policy, inventory, content scan. Dependency CVEs are not scanned here.
+    With fail_fast, the first stage reporting errors is the last one run.
+    Per-file content results are reused from and recorded into `findings`.
+    Returns (errors, warnings, commands, manifest, network_detected, detected_domains).
+    """
+    return run_validation_stages(source, tier, findings, fail_fast)[:6]
+
 
-    commands = extract_command_names(repo_path)
+def run_validation_stages(
+    source,
+    tier: str,
+    findings: Optional[Dict[str, FileFindings]] = None,
+    fail_fast: bool = False
+) -> Tuple[List[str], List[str], Set[str], Optional[dict], bool, Set[str], Optional[str]]:
+    """
+    validate_plugin_source, also returning the first stage that reported
+    errors (None when none did).
+    """
+    if findings is None:
+        findings = {}
+
+    def first_failure(stage: str) -> None:
+        nonlocal failed
+        if errors and failed is None:
+            failed = stage
+
+    failed: Optional[str] = None
+    errors, warnings, manifest, manifest_data = check_manifest(source, tier)
+    first_failure("manifest")
+
+    allowed_domains: Set[str] = set()
+    if not (fail_fast and errors):
+        policy_errors, allowed_domains = check_policy(manifest, manifest_data, tier)
+        errors.extend(policy_errors)
+        first_failure("policy")
+
+    if not (fail_fast and errors):
+        inventory_errors, inventory_warnings = check_inventory(source, findings)
+        errors.extend(inventory_errors)
+        warnings.extend(inventory_warnings)
+        first_failure("inventory")
+
+    commands = extract_command_names(source)
     if len(commands) == 0:
         warnings.append("No commands detected under commands/ (ok if plugin uses hooks/agents only)")
 
-    # Security scan
-    sec_errors, sec_warnings, network_detected, detected_domains = security_scan_repo(
-        repo_path, files, tier, allowed_domains
+    network_detected = False
+    detected_domains: Set[str] = set()
+    if not (fail_fast and errors):
+        # Security scan
+        sec_errors, sec_warnings, network_detected, detected_domains = security_scan_repo(
+            source, tier, allowed_domains, findings
+        )
+        errors.extend(sec_errors)
+        warnings.extend(sec_warnings)
+
+        # Consistency check
+        if manifest_data:
+            consistency_errors = check_consistency(tier, manifest_data, network_detected, detected_domains)
+            errors.extend(consistency_errors)
+        first_failure("content")
+
+    if fail_fast and errors:
+        warnings.append(fail_fast_note(failed))
+    return errors, warnings, commands, manifest_data, network_detected, detected_domains, failed
+
+
+def validate_plugin_repo(
+    repo_path: Path,
+    tier: str,
+    scan_cves: bool = True,
+    fail_fast: bool = False
+) -> Tuple[List[str], List[str], Set[str], Optional[dict], bool, Set[str]]:
+    """
+    Validate a cloned plugin repository.
+    Dependency CVE findings come last and are skipped when scan_cves is False,
+    so callers can cache them separately from the commit-bound results,
+    or with fail_fast once an earlier stage has failed.
+    Returns (errors, warnings, commands, manifest, network_detected, detected_domains).
+    """
+    errors, warnings, commands, manifest_data, network_detected, detected_domains = validate_plugin_source(
+        WorkingTreeSource(repo_path), tier, fail_fast=fail_fast
     )
-    errors.extend(sec_errors)
-    warnings.extend(sec_warnings)
 
     # CVE scan for dependencies
-    cve_errors, cve_warnings = scan_dependencies_for_cves(repo_path, tier)
-    errors.extend(cve_errors)
-    warnings.extend(cve_warnings)
-
-    # Consistency check
-    if manifest_data:
-        consistency_errors = check_consistency(tier, manifest_data, network_detected, detected_domains)
-        errors.extend(consistency_errors)
+    if scan_cves and not (fail_fast and errors):
+        cve_errors, cve_warnings = scan_dependencies_for_cves(repo_path, tier)
+        errors.extend(cve_errors)
+        warnings.extend(cve_warnings)
 
     return errors, warnings, commands, manifest_data, network_detected, detected_domains
 
 
 # =========================
-# MAIN
+# RESULT CACHE
 # =========================
 
-def main() -> int:
-    marketplace = load_marketplace()
+# Bump when the cached record layout or validation semantics change
+RESULT_CACHE_VERSION = 9
+
+
+def policy_fingerprint() -> str:
+    """Hash of every validator setting that can change a plugin's result."""
+    policy = {
+        "version": RESULT_CACHE_VERSION,
+        "limits": [MAX_FILE_SIZE_BYTES, MAX_REPO_SIZE_BYTES, MAX_FILES_COUNT, MAX_READ_BYTES_FOR_BINARY_CHECK],
+        "required_files": REQUIRED_FILES,
+        "manifests": POSSIBLE_PLUGIN_MANIFESTS,
+        "content_dirs": POSSIBLE_CONTENT_DIRS,
+        "disallowed_extensions": sorted(DISALLOWED_EXTENSIONS),
+        "magic_numbers": [(magic.hex(), kind) for magic, kind in MAGIC_NUMBERS],
+        "text_extensions": sorted(TEXT_EXTENSIONS),
+        "scannable_extensions": sorted(SCANNABLE_EXTENSIONS),
+        "language_by_extension": LANGUAGE_BY_EXTENSION,
+        "language_rule_groups": {k: sorted(v) for k, v in LANGUAGE_RULE_GROUPS.items()},
+        "network_rule_groups": NETWORK_RULE_GROUPS,
+        "shebang_languages": SHEBANG_LANGUAGES,
+        "shebang_dirs": sorted(SHEBANG_DIRS),
+        "skip_dirs": sorted(SKIP_DIRS),
+        "secret_patterns": SECRET_PATTERNS,
+        "line_windows": [SCAN_LINE_WINDOW, SCAN_LINE_OVERLAP, SCAN_MATCH_MAX_LENGTH],
+        "minified": [MINIFIED_LINE_LENGTH, MINIFIED_MAX_WHITESPACE],
+        "secret_tokens": [SECRET_TOKEN_CHARS, LEAKED_MIN_LENGTH],
+        "leaked_credentials": leaked_filter().source_digest if leaked_filter() else None,
+        "entropy": [
+            ENTROPY_MIN_LENGTH, ENTROPY_MAX_LENGTH, ENTROPY_THRESHOLDS, ENTROPY_REJECT_MIN_LENGTH,
+            sorted(HEX_DIGEST_LENGTHS), sorted(LOCKFILE_NAMES), INTEGRITY_PREFIXES,
+            ENTROPY_SEQUENCES, ENTROPY_WORD_RE.pattern, URL_PREFIX_RE.pattern.decode("ascii"),
+        ],
+        "network_patterns": NETWORK_PATTERNS,
+        "telemetry_patterns": TELEMETRY_PATTERNS,
+        "cve_policy": CVE_POLICY,
+    }
+    return hashlib.sha256(json.dumps(policy, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def result_cache_key(commit: str, plugin: dict) -> str:
+    """Cache key for a (commit, marketplace entry, validator policy) triple."""
+    material = json.dumps(
+        {"commit": commit, "entry": plugin, "policy": policy_fingerprint()},
+        sort_keys=True,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
 
-    schema_errors = validate_marketplace_schema(marketplace)
-    if schema_errors:
-        print("❌ Marketplace schema invalid:")
-        for e in schema_errors:
-            print(f"  - {e}")
-        return 1
 
-    plugins = marketplace.get("plugins", [])
+def load_cached_result(key: str) -> Optional[dict]:
+    path = RESULTS_DIR / f"{key}.json"
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    touch_cache_file(path)
+    return record
 
-    if not plugins:
-        print("✅ Marketplace validated (no plugins to check)")
-        return 0
 
-    ensure_tmp()
+def store_cached_result(key: str, record: dict) -> None:
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    path = RESULTS_DIR / f"{key}.json"
+    tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(record, sort_keys=True, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
 
-    results: List[PluginResult] = []
-    all_command_index: Dict[str, List[str]] = {}
 
+def cve_results_fresh(record: dict) -> bool:
+    if record["cve"] is None:
+        return True  # rejected before any content was fetched; nothing to rescan
+    return time.time() - record["cve"]["scanned_at"] < CVE_CACHE_TTL_SECONDS
+
+
+def cve_record(cve_errors: List[str], cve_warnings: List[str]) -> dict:
+    """
+    CVE findings as cached with a result. An audit that timed out is recorded
+    as never run, so the next run retries it rather than trusting it for
+    CVE_CACHE_TTL_SECONDS.
+    """
+    timed_out = any(w.startswith("CVE SCAN:") and " timed out" in w for w in cve_warnings)
+    return {"errors": cve_errors, "warnings": cve_warnings, "scanned_at": 0.0 if timed_out else time.time()}
+
+
+def result_to_record(result: PluginResult, commands: Set[str], failed_stage: Optional[str] = None) -> dict:
+    """
+    Serialize the commit-bound part of a result, with the first validation
+    stage that failed; CVE findings are attached separately.
+    """
+    return {
+        "commit": result.commit,
+        "failed_stage": failed_stage,
+        "errors": result.errors,
+        "warnings": result.warnings,
+        "network_detected": result.network_detected,
+        "detected_domains": sorted(result.detected_domains),
+        "commands": sorted(commands),
+        "manifest": result.manifest,
+        "cve": None,
+    }
+
+
+def result_from_record(record: dict, name: str, tier: str, url: str) -> Tuple[PluginResult, Set[str]]:
+    """Replay a cached record as a PluginResult. Returns (result, command_names)."""
+    cve = record["cve"] or {"errors": [], "warnings": []}
+    result = PluginResult(
+        name=name,
+        tier=tier,
+        url=url,
+        errors=record["errors"] + cve["errors"],
+        warnings=record["warnings"] + cve["warnings"],
+        network_detected=record["network_detected"],
+        detected_domains=set(record["detected_domains"]),
+        commit=record["commit"],
+        manifest=record["manifest"],
+    )
+    return result, set(record["commands"])
+
+
+# =========================
+# INCREMENTAL SCAN STATE
+# =========================
+
+def load_scan_state(name: str) -> Optional[dict]:
+    path = SCAN_STATE_DIR / f"{name}.json"
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    touch_cache_file(path)
+    return state
+
+
+def save_scan_state(name: str, commit: str, plugin: dict, findings: Dict[str, FileFindings]) -> None:
+    """Remember the per-file findings of the last validated commit of a plugin."""
+    SCAN_STATE_DIR.mkdir(parents=True, exist_ok=True)
+    state = {
+        "commit": commit,
+        "policy": policy_fingerprint(),
+        "entry": plugin,
+        "files": {rel: asdict(f) for rel, f in sorted(findings.items())},
+    }
+    path = SCAN_STATE_DIR / f"{name}.json"
+    tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(state, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def changed_paths(mirror: Path, old: str, new: str) -> Optional[Set[str]]:
+    """
+    Paths added, modified or deleted between old and new, or None when new does
+    not descend from old (force-push, history rewrite) and a full scan is needed.
+    """
+    code, _ = run_git(mirror, ["merge-base", "--is-ancestor", old, new])
+    if code != 0:
+        return None
+    code, out = run_git(mirror, ["diff-tree", "-r", "--no-renames", "--name-only", "-z", old, new])
+    if code != 0:
+        return None
+    return {p for p in out.split("\0") if p}
+
+
+def carried_findings(mirror: Path, name: str, plugin: dict, commit: str) -> Tuple[Dict[str, FileFindings], Optional[str]]:
+    """
+    Per-file findings from the last validated commit for files untouched since.
+    Returns (findings, base_commit); base_commit is None when a full scan is required.
+    """
+    state = load_scan_state(name)
+    if not state or state["policy"] != policy_fingerprint() or state["entry"] != plugin:
+        return {}, None
+    changed = changed_paths(mirror, state["commit"], commit)
+    if changed is None:
+        return {}, None
+    findings = {
+        rel: FileFindings(**record)
+        for rel, record in state["files"].items()
+        if rel not in changed
+    }
+    return findings, state["commit"]
+
+
+# =========================
+# BLOB SCAN CACHE
+# =========================
+
+# Content-derived file results keyed by git blob id, shared by every plugin and
+# run. Records live under a directory named for the policy fingerprint, so a
+# policy change starts a fresh store. Each record holds the head classification
+# ("sniff") and the content scan per language ("scans").
+_blob_cache_dir: Optional[Path] = None  # None: cache disabled
+_blob_records: Dict[str, dict] = {}
+_blob_lock = threading.Lock()
+
+
+def configure_blob_cache(enabled: bool) -> None:
+    global _blob_cache_dir
+    _blob_cache_dir = BLOB_CACHE_DIR / policy_fingerprint()[:16] if enabled else None
+    _blob_records.clear()
+
+
+def _load_blob_record(oid: str) -> Optional[dict]:
+    if oid in _blob_records:
+        return _blob_records[oid]
+    path = _blob_cache_dir / oid[:2] / f"{oid}.json"
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    touch_cache_file(path)
+    _blob_records[oid] = record
+    return record
+
+
+def load_blob_record(oid: str) -> Optional[dict]:
+    """The cached record of a blob, or None when unseen or the cache is disabled."""
+    if _blob_cache_dir is None:
+        return None
+    with _blob_lock:
+        return _load_blob_record(oid)
+
+
+def cached_blob_scan(oid: str, language: str) -> Optional[dict]:
+    record = load_blob_record(oid)
+    return record.get("scans", {}).get(language) if record else None
+
+
+def store_blob_record(oid: str, sniff: Optional[list] = None, scan: Optional[dict] = None) -> None:
+    """Merge a head classification or a content scan into a blob's record."""
+    if _blob_cache_dir is None:
+        return
+    with _blob_lock:
+        record = dict(_load_blob_record(oid) or {})
+        if sniff is not None:
+            record["sniff"] = sniff
+        if scan is not None:
+            record["scans"] = {**record.get("scans", {}), scan["language"]: scan}
+        _blob_records[oid] = record
+        path = _blob_cache_dir / oid[:2] / f"{oid}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(record, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+# =========================
+# CACHE PRUNING
+# =========================
+
+# Cached results, scan states and blob records not read or written for this
+# long are deleted at the start of a run; blob stores of other policy
+# fingerprints are deleted outright, as no run of this validator reads them
+CACHE_MAX_AGE_SECONDS = 30 * 24 * 3600
+
+
+def touch_cache_file(path: Path) -> None:
+    """Mark a cache file as used, so pruning keeps it."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def prune_cache_files(directory: Path, cutoff: float) -> int:
+    """Delete files under directory last used before cutoff. Returns how many."""
+    removed = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = Path(root) / name
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                pass  # removed concurrently
+    return removed
+
+
+def prune_caches() -> int:
+    """
+    Bound the on-disk caches: drop blob stores of other policy fingerprints and
+    every cache file unused for CACHE_MAX_AGE_SECONDS. Returns files removed.
+    """
+    removed = 0
+    current = policy_fingerprint()[:16]
+    if BLOB_CACHE_DIR.is_dir():
+        for store in BLOB_CACHE_DIR.iterdir():
+            if store.name != current:
+                removed += sum(len(names) for _, _, names in os.walk(store))
+                shutil.rmtree(store, ignore_errors=True)
+    cutoff = time.time() - CACHE_MAX_AGE_SECONDS
+    for directory in (RESULTS_DIR, SCAN_STATE_DIR, BLOB_CACHE_DIR / current):
+        removed += prune_cache_files(directory, cutoff)
+    return removed
+
+
+# =========================
+# SHARDING
+# =========================
+
+# Bump when the shard file layout changes
+SHARD_FILE_VERSION = 2
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Translate a --shard value 'i/N' (1 <= i <= N) into (i, N)."""
+    m = re.fullmatch(r"(\d+)/(\d+)", value.strip())
+    if not m or not 1 <= int(m.group(1)) <= int(m.group(2)):
+        raise ValueError(f"--shard must be i/N with 1 <= i <= N, got '{value}'")
+    return int(m.group(1)), int(m.group(2))
+
+
+def shard_plan(
+    plugins: List[dict],
+    shards: int,
+    history: Dict[str, dict],
+    only: Optional[Set[int]] = None
+) -> List[List[int]]:
+    """
+    Split the entries into `shards` lists of similar expected cost: longest
+    expected first (see expected_seconds), each onto the shard with the least
+    cost so far, then the fewest entries. Entries outside `only` get the entry
+    checks alone and cost nothing. The plan depends only on the marketplace,
+    the timings history and `only` (never on local mirrors), so every shard
+    of a CI matrix computes the same one from the same inputs. Shard runs
+    leave the history to --merge for that reason; shard files carry
+    plan_digest, and merge_shards rejects shards of different plans.
+    """
+    full = [idx for idx in range(len(plugins)) if only is None or idx in only]
+    estimates = {idx: 0.0 for idx in range(len(plugins))}
+    estimates.update(expected_seconds(plugins, full, history, mirror_sizes=False))
+
+    plan: List[List[int]] = [[] for _ in range(shards)]
+    loads = [0.0] * shards
+    for idx in sorted(estimates, key=lambda idx: (-estimates[idx], idx)):
+        shard = min(range(shards), key=lambda i: (loads[i], len(plan[i]), i))
+        plan[shard].append(idx)
+        loads[shard] += estimates[idx]
+    return [sorted(entries) for entries in plan]
+
+
+def marketplace_digest(plugins: List[dict]) -> str:
+    """Hash of the marketplace entries, identifying the marketplace a shard validated."""
+    return hashlib.sha256(json.dumps(plugins, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def plan_digest(plan: List[List[int]]) -> str:
+    """Hash of a shard plan, identifying the split a shard belongs to."""
+    return hashlib.sha256(json.dumps(plan).encode("utf-8")).hexdigest()
+
+
+def write_shard_file(
+    path: Path,
+    shard: Tuple[int, int],
+    plugins: List[dict],
+    plan: List[List[int]],
+    outcomes: Dict[int, Tuple[PluginResult, Set[str]]]
+) -> None:
+    """Write the outcomes (with timings) of one shard's entries, by marketplace index, for merge_shards."""
+    doc = {
+        "version": SHARD_FILE_VERSION,
+        "shard": list(shard),
+        "marketplace": marketplace_digest(plugins),
+        "plan": plan_digest(plan),
+        "results": [
+            {
+                "index": idx,
+                "result": {**asdict(result), "detected_domains": sorted(result.detected_domains)},
+                "commands": sorted(cmd_names),
+            }
+            for idx, (result, cmd_names) in sorted(outcomes.items())
+        ],
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(doc, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def load_shard_file(path: Path) -> dict:
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            doc = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"Could not read shard file {path}: {e}")
+    if doc.get("version") != SHARD_FILE_VERSION:
+        raise ValueError(f"Shard file {path} has version {doc.get('version')}, expected {SHARD_FILE_VERSION}")
+    return doc
+
+
+def merge_shards(plugins: List[dict], docs: List[dict]) -> List[Tuple[PluginResult, Set[str]]]:
+    """
+    Combine shard files into one outcome per marketplace entry, in marketplace
+    order. Every shard of the same marketplace and plan must be present once,
+    and each entry validated by one shard at most; an entry no shard
+    validated fails with an error instead of silently passing.
+    """
+    digest = marketplace_digest(plugins)
+    shards = {doc["shard"][1] for doc in docs}
+    if len(shards) != 1:
+        raise ValueError(f"Shard files split the marketplace differently: {sorted(shards)} shards")
+    total = shards.pop()
+    seen = sorted(doc["shard"][0] for doc in docs)
+    if seen != list(range(1, total + 1)):
+        raise ValueError(f"Expected shards 1..{total} once each, got {seen}")
+    if any(doc["marketplace"] != digest for doc in docs):
+        raise ValueError("Shard files were produced from a different marketplace.json")
+    if len({doc["plan"] for doc in docs}) != 1:
+        raise ValueError("Shard files were produced from different shard plans (were the timings the same?)")
+
+    by_index: Dict[int, Tuple[PluginResult, Set[str]]] = {}
+    for doc in docs:
+        for record in doc["results"]:
+            if record["index"] in by_index:
+                raise ValueError(f"Entry {record['index']} was validated by more than one shard")
+            fields = dict(record["result"], detected_domains=set(record["result"]["detected_domains"]))
+            by_index[record["index"]] = (PluginResult(**fields), set(record["commands"]))
+
+    outcomes: List[Tuple[PluginResult, Set[str]]] = []
     for idx, plugin in enumerate(plugins):
-        name, tier, url, entry_errors = parse_plugin_entry(plugin)
-
-        if entry_errors or not name or not tier or not url:
-            results.append(
-                PluginResult(
-                    name=name or f"plugin_{idx}",
-                    tier=tier or "unknown",
-                    url=url or "missing",
-                    errors=entry_errors or ["Invalid marketplace entry"],
-                )
-            )
+        if idx in by_index:
+            outcomes.append(by_index[idx])
             continue
+        name, tier, url, _ = parse_plugin_entry(plugin)
+        outcomes.append((PluginResult(
+            name=name or f"plugin_{idx}",
+            tier=tier or "unknown",
+            url=url or "missing",
+            errors=["Not validated: no shard produced a result for this entry"],
+        ), set()))
+    return outcomes
 
-        safe_dir = name.replace("/", "_").replace(":", "_")
-        dest = TMP_DIR / safe_dir
 
-        tier_badge = "🔒" if tier == "curated" else "🌐"
-        print(f"{tier_badge} Validating: {name} [{tier}] -> {url}")
+# =========================
+# PLUGIN BUDGETS
+# =========================
 
-        result = PluginResult(name=name, tier=tier, url=url)
+CPU_GRACE_SECONDS = 5    # from SIGXCPU at the CPU budget to SIGKILL
+WORKER_EXIT_SECONDS = 10  # for a worker that has sent its result to exit on its own
+
+# Module state a spawned worker must share with this process (the CLI and tests change it)
+WORKER_SETTINGS = (
+    "TMP_DIR", "MIRRORS_DIR", "RESULTS_DIR", "SCAN_STATE_DIR", "BLOB_CACHE_DIR",
+    "LEAKED_FILTER_DIR", "LEAKED_CREDENTIALS_FILE",
+    "_scan_workers", "_blob_cache_dir", "_fail_fast", "_subprocess_timeout",
+)
 
-        success, clone_error = clone_repo(url, dest)
-        if not success:
-            result.errors.append(clone_error)
-            print(f"❌ FAIL: {name}")
-            results.append(result)
-            continue
 
+@dataclass(frozen=True)
+class PluginBudget:
+    """
+    Limits on validating one plugin in its own worker process; None leaves a
+    resource unlimited. CPU time and address space are limits per process, so
+    each git, npm or pip-audit command the worker runs gets the same ones.
+    """
+    wall_seconds: Optional[float] = None
+    cpu_seconds: Optional[int] = None
+    memory_mb: Optional[int] = None
+
+
+_plugin_budget: Optional[PluginBudget] = None  # None: plugins are validated in-process
+
+
+def resolve_budget(
+    wall_seconds: Optional[float],
+    cpu_seconds: Optional[int],
+    memory_mb: Optional[int]
+) -> Optional[PluginBudget]:
+    """The budget set by --plugin-timeout/--plugin-cpu/--plugin-memory, or None when none is set."""
+    options = (("--plugin-timeout", wall_seconds), ("--plugin-cpu", cpu_seconds), ("--plugin-memory", memory_mb))
+    for option, value in options:
+        if value is not None and value <= 0:
+            raise ValueError(f"{option} must be positive, got '{value:g}'")
+    if (cpu_seconds is not None or memory_mb is not None) and resource is None:
+        raise ValueError("--plugin-cpu and --plugin-memory need POSIX resource limits, unavailable here")
+    if all(value is None for _, value in options):
+        return None
+    return PluginBudget(wall_seconds, cpu_seconds, memory_mb)
+
+
+def configure_budget(budget: Optional[PluginBudget]) -> None:
+    """Validate each plugin in a worker process held to budget; None validates in-process."""
+    global _plugin_budget
+    _plugin_budget = budget
+
+
+def limit_worker(budget: PluginBudget) -> None:
+    """Put the calling (fresh worker) process in its own process group and under the budget's rlimits."""
+    global _command_sessions
+    if hasattr(os, "setsid"):
+        os.setsid()
+        # Commands stay in the group rather than starting sessions, so stop_worker ends them too
+        _command_sessions = False
+    if budget.cpu_seconds is not None:
+        resource.setrlimit(resource.RLIMIT_CPU, (budget.cpu_seconds, budget.cpu_seconds + CPU_GRACE_SECONDS))
+    if budget.memory_mb is not None:
+        limit = budget.memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def worker_main(conn, settings: Dict[str, Any], budget: PluginBudget, target, args: tuple) -> None:
+    """Entry point of a budgeted worker: sends ("ok", target(*args)), or ("memory", None) if memory ran out."""
+    globals().update(settings)
+    limit_worker(budget)
+    try:
+        message = ("ok", target(*args))
+    except MemoryError:
+        message = ("memory", None)
+    sys.stdout.flush()
+    conn.send(message)
+    conn.close()
+
+
+def stop_worker(worker: multiprocessing.Process) -> None:
+    """
+    Kill a worker with every command still running in its process group, and
+    reap it. Nothing may reap the worker before: its pid names the group.
+    Called however the worker ended, so commands it left behind are ended too.
+    """
+    if hasattr(os, "killpg"):
         try:
-            repo_errors, repo_warnings, cmd_names, manifest, net_detected, det_domains = validate_plugin_repo(
-                dest, tier
-            )
-            result.errors.extend(repo_errors)
-            result.warnings.extend(repo_warnings)
-            result.network_detected = net_detected
-            result.detected_domains = det_domains
+            os.killpg(worker.pid, signal.SIGKILL)
+        except OSError:
+            pass  # exited with its group, or killed before it started one
+    if worker.is_alive():
+        worker.kill()
+    worker.join()
 
-            for c in cmd_names:
-                all_command_index.setdefault(c, []).append(name)
 
-            if result.errors:
-                print(f"❌ FAIL: {name}")
-            else:
-                print(f"✅ OK: {name}")
+def run_in_worker(target, args: tuple, budget: PluginBudget) -> Tuple[Any, str]:
+    """
+    Call target(*args) in a fresh 'spawn' process held to budget.
+    Returns (value, error): error says which budget was exceeded or how the
+    worker died, and value is then None.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    receiver, sender = ctx.Pipe(duplex=False)
+    settings = {name: globals()[name] for name in WORKER_SETTINGS}
+    worker = ctx.Process(target=worker_main, args=(sender, settings, budget, target, args))
+    worker.start()
+    sender.close()
+    message = None
+    expired = False
+    try:
+        if receiver.poll(budget.wall_seconds):
+            message = receiver.recv()
+            # Let it flush and exit; waiting on the sentinel does not reap it
+            multiprocessing.connection.wait([worker.sentinel], WORKER_EXIT_SECONDS)
+        else:
+            expired = True
+    except EOFError:
+        pass  # died without a result; its exit code tells why
+    finally:
+        receiver.close()
+        stop_worker(worker)
+
+    if message is not None and message[0] == "ok":
+        return message[1], ""
+    if message is not None and budget.memory_mb is not None:
+        return None, f"Budget exceeded: needed more than the {budget.memory_mb}MB memory budget"
+    if message is not None:
+        return None, "Validation worker ran out of memory"
+    if expired:
+        return None, f"Budget exceeded: still running after the {budget.wall_seconds:g}s wall-clock budget"
+    # The kernel signals SIGXCPU at the CPU limit; a SIGKILL comes from elsewhere
+    # (the out-of-memory killer, an operator), never from RLIMIT_CPU's soft limit
+    if budget.cpu_seconds is not None and worker.exitcode == -signal.SIGXCPU:
+        return None, f"Budget exceeded: used more than the {budget.cpu_seconds}s CPU-time budget"
+    if worker.exitcode is not None and worker.exitcode < 0:
+        cause = signal.Signals(-worker.exitcode).name
+        if worker.exitcode == -signal.SIGKILL:
+            cause += ", likely out of memory"
+        return None, f"Validation worker was killed ({cause})"
+    return None, f"Validation worker exited unexpectedly (exit code {worker.exitcode})"
+
+
+def validate_in_worker(
+    idx: int,
+    plugin: dict,
+    use_cache: bool = True,
+    fetched: Optional[Tuple[Optional[Path], str, float]] = None
+) -> Tuple[PluginResult, Set[str]]:
+    """
+    validate_entry in a worker process held to the configured budget. The
+    mirror is fetched here, and its lock held while the worker uses it, since
+    the worker cannot see this process's mirror locks. A plugin whose worker
+    exceeds the budget fails with a "Budget exceeded" error; the others carry on.
+    """
+    name, tier, url, entry_errors = parse_plugin_entry(plugin)
+    if entry_errors or not name or not tier or not url:
+        return validate_entry(idx, plugin, use_cache)  # entry checks only: nothing to isolate
+
+    if fetched is None:
+        started = time.perf_counter()
+        mirror, fetch_error = fetch_mirror(url)
+        fetched = (mirror, fetch_error, time.perf_counter() - started)
+    started = time.perf_counter()
+    with _mirror_lock(fetched[0]) if fetched[0] else nullcontext():
+        outcome, error = run_in_worker(validate_entry, (idx, plugin, use_cache, fetched), _plugin_budget)
+    if not error:
+        return outcome
+
+    print(f"❌ FAIL: {name} ({error})")
+    return PluginResult(
+        name=name, tier=tier, url=url, errors=[error],
+        timings={"clone": fetched[2], "worker": time.perf_counter() - started},
+    ), set()
+
+
+def run_entry(
+    idx: int,
+    plugin: dict,
+    use_cache: bool = True,
+    fetched: Optional[Tuple[Optional[Path], str, float]] = None
+) -> Tuple[PluginResult, Set[str]]:
+    """validate_entry, in a budgeted worker process when a budget is configured."""
+    if _plugin_budget is not None:
+        return validate_in_worker(idx, plugin, use_cache, fetched)
+    return validate_entry(idx, plugin, use_cache, fetched)
 
-        except Exception as e:
-            result.errors.append(f"Unhandled error: {e}")
+
+# =========================
+# MAIN
+# =========================
+
+def resolve_jobs(value: str, plugin_count: int) -> int:
+    """Translate a --jobs value ('auto' or a positive integer) into a worker count."""
+    if value == "auto":
+        # Validation is dominated by git/npm subprocess time, not CPU
+        jobs = max(4, os.cpu_count() or 1)
+    else:
+        try:
+            jobs = int(value)
+        except ValueError:
+            raise ValueError(f"--jobs must be a positive integer or 'auto', got '{value}'")
+        if jobs < 1:
+            raise ValueError(f"--jobs must be a positive integer or 'auto', got '{value}'")
+    return max(1, min(jobs, plugin_count))
+
+
+def validate_entry(
+    idx: int,
+    plugin: dict,
+    use_cache: bool = True,
+    fetched: Optional[Tuple[Optional[Path], str, float]] = None
+) -> Tuple[PluginResult, Set[str]]:
+    """
+    Fetch and validate a single marketplace entry straight from its mirror's object
+    database; only dependency manifests are written to its workspace under TMP_DIR.
+    `fetched` is the (mirror, error, seconds) of a fetch already done by the fetch stage.
+    Unchanged plugins are replayed from the result cache.
+    In fail-fast mode a plugin stops at the first failing stage (see VALIDATION_STAGES).
+    The time spent in each phase is kept in result.timings.
+    Returns (result, command_names).
+    """
+    name, tier, url, entry_errors = parse_plugin_entry(plugin)
+
+    if entry_errors or not name or not tier or not url:
+        return PluginResult(
+            name=name or f"plugin_{idx}",
+            tier=tier or "unknown",
+            url=url or "missing",
+            errors=entry_errors or ["Invalid marketplace entry"],
+        ), set()
+
+    safe_dir = name.replace("/", "_").replace(":", "_")
+    dest = TMP_DIR / safe_dir
+
+    tier_badge = "🔒" if tier == "curated" else "🌐"
+    print(f"{tier_badge} Validating: {name} [{tier}] -> {url}")
+
+    timings: Dict[str, float] = {}
+    result = PluginResult(name=name, tier=tier, url=url, timings=timings)
+    cmd_names: Set[str] = set()
+
+    try:
+        started = time.perf_counter()
+        if fetched is not None:
+            mirror, fetch_error, timings["clone"] = fetched
+        else:
+            mirror, fetch_error = fetch_mirror(url)
+        commit = resolve_commit(mirror) if mirror else None
+        timings["clone"] = timings.get("clone", 0.0) + time.perf_counter() - started
+        if mirror is None or commit is None:
+            result.errors.append(f"Could not clone {url}: {fetch_error or 'no commit at HEAD'}")
+            print(f"❌ FAIL: {name}")
+            return result, cmd_names
+        result.commit = commit
+
+        key = result_cache_key(commit, plugin)
+        cached = load_cached_result(key) if use_cache else None
+        if cached and cve_results_fresh(cached):
+            result, cmd_names = result_from_record(cached, name, tier, url)
+            result.timings = timings
+            print(f"{'❌ FAIL' if result.errors else '✅ OK'}: {name} (cached @ {commit[:12]})")
+            return result, cmd_names
+
+        started = time.perf_counter()
+        precheck_errors, entries = precheck_repo(mirror, commit)
+        timings["walk"] = time.perf_counter() - started
+        if precheck_errors:
+            # Rejected from tree metadata alone: no checkout, no content or CVE scan
+            result.errors.extend(precheck_errors)
+            if use_cache:
+                store_cached_result(key, result_to_record(result, cmd_names, "inventory"))
+            print(f"❌ FAIL: {name}")
+            return result, cmd_names
+
+        started = time.perf_counter()
+        with BlobReader(mirror) as reader:
+            source = GitTreeSource(entries, reader)
+            if cached:
+                # Code is unchanged; only the advisory data may have moved on
+                record = dict(cached)
+            else:
+                findings, base_commit = (
+                    carried_findings(mirror, name, plugin, commit) if use_cache else ({}, None)
+                )
+                if base_commit:
+                    print(f"   ↻ {name}: rescanning changes since {base_commit[:12]}")
+                (repo_errors, repo_warnings, cmd_names, manifest,
+                 net_detected, det_domains, failed_stage) = run_validation_stages(source, tier, findings, _fail_fast)
+                if use_cache:
+                    current = {e.path for e in entries}
+                    save_scan_state(name, commit, plugin, {
+                        rel: f for rel, f in findings.items() if rel in current
+                    })
+                result.errors.extend(repo_errors)
+                result.warnings.extend(repo_warnings)
+                result.network_detected = net_detected
+                result.detected_domains = det_domains
+                result.manifest = manifest
+                record = result_to_record(result, cmd_names, failed_stage)
+            stopped = _fail_fast and bool(record["errors"])
+            if not stopped:
+                write_dependency_files(source, dest)
+        timings["scan"] = time.perf_counter() - started
+
+        if stopped:
+            # No dependency install or audit; the incomplete result is not cached
+            record["cve"] = None
+            if cached:
+                record["warnings"] = record["warnings"] + [fail_fast_note(record["failed_stage"])]
+        else:
+            started = time.perf_counter()
+            record["cve"] = cve_record(*scan_dependencies_for_cves(dest, tier))
+            timings["cve"] = time.perf_counter() - started
+            if use_cache:
+                store_cached_result(key, record)
+        result, cmd_names = result_from_record(record, name, tier, url)
+        result.timings = timings
+
+        if result.errors:
             print(f"❌ FAIL: {name}")
+        else:
+            print(f"✅ OK: {name}")
+
+    except Exception as e:
+        result.errors.append(f"Unhandled error: {e}")
+        print(f"❌ FAIL: {name}")
+
+    return result, cmd_names
+
 
+def resolve_prefetch(value: str, jobs: int) -> int:
+    """Translate a --prefetch value ('auto' or a count, 0 for none) into how many entries to fetch ahead."""
+    if value == "auto":
+        return 2 * jobs
+    try:
+        prefetch = int(value)
+    except ValueError:
+        raise ValueError(f"--prefetch must be a non-negative integer or 'auto', got '{value}'")
+    if prefetch < 0:
+        raise ValueError(f"--prefetch must be a non-negative integer or 'auto', got '{value}'")
+    return prefetch
+
+
+async def validate_prefetched(
+    plugins: List[dict],
+    indices: List[int],
+    jobs: int,
+    prefetch: int,
+    use_cache: bool = True
+) -> List[Tuple[PluginResult, Set[str]]]:
+    """
+    Validate entries with the network and the scans kept busy at once: a fetch
+    stage updates mirrors (async git, see fetch_source) ahead of `jobs`
+    validation threads. Fetched entries wait in a queue of `prefetch`; while
+    it is full the fetch stage waits, so at most prefetch + jobs + 1 entries
+    are fetched but not yet validated. Entries sharing a source URL share one fetch.
+    Returns outcomes in the order of `indices`.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=prefetch)
+    host_limits: Dict[str, asyncio.Semaphore] = {}
+    fetches: Dict[str, asyncio.Task] = {}
+    outcomes: Dict[int, Tuple[PluginResult, Set[str]]] = {}
+
+    async def fetch_stage() -> None:
+        for idx in indices:
+            _, _, url, entry_errors = parse_plugin_entry(plugins[idx])
+            task = None
+            if url and not entry_errors:
+                key = normalize_source_url(url)
+                if key not in fetches:
+                    fetches[key] = asyncio.create_task(fetch_source(url, host_limits))
+                task = fetches[key]
+            await queue.put((idx, task))
+        for _ in range(jobs):
+            await queue.put(None)
+
+    async def validation_stage(executor: ThreadPoolExecutor) -> None:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            idx, task = item
+            fetched = await task if task is not None else None
+            outcomes[idx] = await loop.run_in_executor(
+                executor, run_entry, idx, plugins[idx], use_cache, fetched
+            )
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        await asyncio.gather(fetch_stage(), *(validation_stage(executor) for _ in range(jobs)))
+    return [outcomes[idx] for idx in indices]
+
+
+def load_timings() -> Dict[str, dict]:
+    """Phase timings of each plugin's last validation, by plugin name."""
+    try:
+        with TIMINGS_FILE.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_timings(history: Dict[str, dict], results: List[PluginResult]) -> None:
+    """
+    Record the phase timings of validated plugins, with the disk size of their
+    mirror. Phases a run skipped (a cached result replays no walk, scan or cve)
+    keep their last measurement from the same source.
+    """
+    for result in results:
+        if not result.timings:
+            continue
+        mirror = mirror_path(result.url)
+        url = normalize_source_url(result.url)
+        previous = history.get(result.name, {})
+        phases = dict(previous.get("phases", {})) if previous.get("url") == url else {}
+        phases.update((phase, round(seconds, 3)) for phase, seconds in result.timings.items())
+        history[result.name] = {
+            "url": url,
+            "phases": phases,
+            "mirror_bytes": directory_size(mirror) if mirror.exists() else 0,
+        }
+    TIMINGS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = TIMINGS_FILE.with_name(f"{TIMINGS_FILE.name}.tmp")
+    tmp.write_text(json.dumps(history, sort_keys=True, indent=1), encoding="utf-8")
+    os.replace(tmp, TIMINGS_FILE)
+
+
+def directory_size(path: Path) -> int:
+    """Bytes in the files under path."""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def expected_seconds(
+    plugins: List[dict],
+    indices: List[int],
+    history: Dict[str, dict],
+    mirror_sizes: bool = True
+) -> Dict[int, float]:
+    """
+    How long each entry is expected to take: its last run's total, while its
+    source URL is unchanged. Entries without one are estimated from the size
+    of their mirror at the median seconds per mirror byte of the others, or,
+    with no mirror yet (or without `mirror_sizes`), as long as the longest
+    known entry, so an unknown plugin is never the one left running at the end.
+    """
+    known: Dict[int, float] = {}
+    unknown: List[Tuple[int, Optional[str]]] = []
+    rates: List[float] = []
+    for record in history.values():
+        if record.get("mirror_bytes"):
+            rates.append(sum(record["phases"].values()) / record["mirror_bytes"])
+    for idx in indices:
+        name, _, url, _ = parse_plugin_entry(plugins[idx])
+        record = history.get(name or "")
+        if url and record and record["url"] == normalize_source_url(url):
+            known[idx] = sum(record["phases"].values())
+        else:
+            unknown.append((idx, url))
+
+    rate = sorted(rates)[len(rates) // 2] if rates else None
+    longest = max(known.values(), default=0.0)
+    estimates = dict(known)
+    for idx, url in unknown:
+        mirror = mirror_path(url) if url else None
+        if mirror_sizes and rate is not None and mirror is not None and (mirror / "HEAD").exists():
+            estimates[idx] = rate * directory_size(mirror)
+        else:
+            estimates[idx] = longest
+    return estimates
+
+
+def schedule_longest_first(plugins: List[dict], indices: List[int], history: Dict[str, dict]) -> List[int]:
+    """Order entries longest expected first (ties in marketplace order), to shorten a parallel run."""
+    estimates = expected_seconds(plugins, indices, history)
+    return sorted(indices, key=lambda idx: -estimates[idx])
+
+
+def check_entry(idx: int, plugin: dict) -> Tuple[PluginResult, Set[str]]:
+    """Run only the marketplace entry checks for an entry; its repo is not fetched."""
+    name, tier, url, entry_errors = parse_plugin_entry(plugin)
+    return PluginResult(
+        name=name or f"plugin_{idx}",
+        tier=tier or "unknown",
+        url=url or "missing",
+        errors=entry_errors,
+        entry_only=True,
+    ), set()
+
+
+def validate_all(
+    plugins: List[dict],
+    jobs: int = 1,
+    use_cache: bool = True,
+    only: Optional[Set[int]] = None,
+    scan_workers: int = 1,
+    prefetch: int = 0,
+    fail_fast: bool = False,
+    budget: Optional[PluginBudget] = None
+) -> Tuple[List[PluginResult], Dict[str, List[str]]]:
+    """
+    Validate every marketplace entry (see validate_outcomes).
+    Results and the command index keep marketplace order regardless of completion order.
+    Returns (results, all_command_index).
+    """
+    return command_index(validate_outcomes(
+        plugins, jobs, use_cache, only, scan_workers, prefetch, fail_fast, budget=budget
+    ))
+
+
+def validate_outcomes(
+    plugins: List[dict],
+    jobs: int = 1,
+    use_cache: bool = True,
+    only: Optional[Set[int]] = None,
+    scan_workers: int = 1,
+    prefetch: int = 0,
+    fail_fast: bool = False,
+    record_timings: bool = True,
+    budget: Optional[PluginBudget] = None
+) -> List[Tuple[PluginResult, Set[str]]]:
+    """
+    Validate every marketplace entry, running up to `jobs` entries concurrently,
+    longest expected first according to the timings of previous runs. This
+    run's timings are recorded for the next unless `record_timings` is off.
+    With `prefetch`, mirrors are fetched up to that many entries ahead of
+    validation (see validate_prefetched).
+    With `fail_fast`, each plugin stops at its first failing stage.
+    With a `budget`, each plugin is validated in a worker process held to it
+    (see validate_in_worker).
+    When `only` is given, entries outside it get the entry checks alone.
+    Large plugins have their files scanned on up to `scan_workers` processes.
+    Returns (result, command_names) per entry, in marketplace order.
+    """
+    full = [idx for idx in range(len(plugins)) if only is None or idx in only]
+    history = load_timings()
+    if jobs > 1:
+        full = schedule_longest_first(plugins, full, history)
+    configure_scan_pool(scan_workers)
+    if use_cache:
+        prune_caches()
+    configure_blob_cache(use_cache)
+    configure_fail_fast(fail_fast)
+    configure_budget(budget)
+    try:
+        if prefetch > 0:
+            validated = asyncio.run(validate_prefetched(plugins, full, jobs, prefetch, use_cache))
+        elif jobs > 1:
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                validated = list(pool.map(
+                    run_entry, full, [plugins[idx] for idx in full], [use_cache] * len(full)
+                ))
+        else:
+            validated = [run_entry(idx, plugins[idx], use_cache) for idx in full]
+    finally:
+        configure_scan_pool(1)
+        configure_blob_cache(False)
+        configure_fail_fast(False)
+        configure_budget(None)
+
+    by_index = dict(zip(full, validated))
+    if record_timings:
+        save_timings(history, [result for result, _ in validated])
+    return [
+        by_index[idx] if idx in by_index else check_entry(idx, plugin)
+        for idx, plugin in enumerate(plugins)
+    ]
+
+
+def command_index(
+    outcomes: List[Tuple[PluginResult, Set[str]]]
+) -> Tuple[List[PluginResult], Dict[str, List[str]]]:
+    """Split outcomes into results and the plugins defining each command name."""
+    results: List[PluginResult] = []
+    all_command_index: Dict[str, List[str]] = {}
+    for result, cmd_names in outcomes:
         results.append(result)
+        for c in sorted(cmd_names):
+            all_command_index.setdefault(c, []).append(result.name)
+
+    return results, all_command_index
 
-    cleanup_tmp()
 
+def print_report(results: List[PluginResult], all_command_index: Dict[str, List[str]]) -> int:
+    """Print the final validation report. Returns the process exit code."""
     # Cross-plugin command collision warnings
     collisions = {cmd: pls for cmd, pls in all_command_index.items() if len(pls) > 1}
 
@@ -1102,6 +4018,8 @@ def main() -> int:
         status = "❌" if r.errors else "✅"
         print(f"{status} {r.name} [{r.tier}] {tier_badge}")
         print(f"   url: {r.url}")
+        if r.entry_only:
+            print(f"   ⏭️  Unchanged entry: marketplace entry checks only")
 
         if r.errors:
             for e in r.errors:
@@ -1140,5 +4058,172 @@ def main() -> int:
     return 1 if failed else 0
 
 
+def add_validation_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options shared by every entry point that runs plugin validation."""
+    parser.add_argument(
+        "--jobs", "-j",
+        default="1",
+        help="Number of plugins to validate concurrently, or 'auto' (default: 1)"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Re-validate every plugin and rescan every file instead of reusing cached results"
+    )
+    parser.add_argument(
+        "--scan-workers",
+        default="auto",
+        help="Processes for scanning the files of large plugins, or 'auto' (default: auto)"
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="Stop validating a plugin at its first failing stage "
+             "(entry, manifest, policy, inventory, content, cve)"
+    )
+    mode.add_argument(
+        "--full",
+        dest="fail_fast",
+        action="store_false",
+        default=False,
+        help="Run every stage of every plugin and report all findings (default)"
+    )
+    parser.add_argument(
+        "--prefetch",
+        default="auto",
+        help="Plugins to fetch ahead of validation, 0 to fetch each as it is validated, "
+             "or 'auto' for two per job (default: auto)"
+    )
+    parser.add_argument(
+        "--plugin-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="Validate each plugin in its own worker process and fail it if still running after SECONDS"
+    )
+    parser.add_argument(
+        "--plugin-cpu",
+        type=int,
+        metavar="SECONDS",
+        help="Validate each plugin in its own worker process limited to SECONDS of CPU time"
+    )
+    parser.add_argument(
+        "--plugin-memory",
+        type=int,
+        metavar="MB",
+        help="Validate each plugin in its own worker process limited to MB of address space "
+             "(also applies to npm, which reserves several GB)"
+    )
+    parser.add_argument(
+        "--subprocess-timeout",
+        type=float,
+        default=SUBPROCESS_TIMEOUT_SECONDS,
+        metavar="SECONDS",
+        help=f"Kill any single git, npm or pip-audit command after SECONDS "
+             f"(default: {SUBPROCESS_TIMEOUT_SECONDS})"
+    )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Validate marketplace plugins")
+    add_validation_arguments(parser)
+    parser.add_argument(
+        "--changed-since",
+        metavar="GIT_REF",
+        help="Fully validate only entries added or modified since GIT_REF; "
+             "run the marketplace entry checks alone on the rest"
+    )
+    parser.add_argument(
+        "--shard",
+        metavar="I/N",
+        help="Validate only the I-th of N cost-balanced subsets of the entries and "
+             "write their results to --shard-output for --merge"
+    )
+    parser.add_argument(
+        "--shard-output",
+        metavar="PATH",
+        help="Where --shard writes its results (default: validation-shard-I-of-N.json)"
+    )
+    parser.add_argument(
+        "--merge",
+        nargs="+",
+        metavar="SHARD_FILE",
+        help="Print the combined report of the results written by every --shard run, without validating"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    marketplace = load_marketplace()
+
+    schema_errors = validate_marketplace_schema(marketplace)
+    if schema_errors:
+        print("❌ Marketplace schema invalid:")
+        for e in schema_errors:
+            print(f"  - {e}")
+        return 1
+
+    plugins = marketplace.get("plugins", [])
+
+    if args.merge:
+        try:
+            outcomes = merge_shards(plugins, [load_shard_file(Path(p)) for p in args.merge])
+        except ValueError as e:
+            fail(str(e))
+        save_timings(load_timings(), [result for result, _ in outcomes])
+        return print_report(*command_index(outcomes))
+
+    if not plugins:
+        print("✅ Marketplace validated (no plugins to check)")
+        return 0
+
+    only = None
+    if args.changed_since:
+        base_plugins, error = load_base_plugins(args.changed_since)
+        if base_plugins is None:
+            fail(error)
+        only = changed_entry_indices(plugins, base_plugins)
+        print(f"🔍 {len(only)} of {len(plugins)} entries changed since {args.changed_since}\n")
+
+    try:
+        shard = parse_shard(args.shard) if args.shard else None
+    except ValueError as e:
+        fail(str(e))
+    entries = set(range(len(plugins)))
+    if shard:
+        plan = shard_plan(plugins, shard[1], load_timings(), only)
+        entries = set(plan[shard[0] - 1])
+        print(f"🧩 Shard {shard[0]}/{shard[1]}: {len(entries)} of {len(plugins)} entries\n")
+        only = entries if only is None else entries & only
+
+    try:
+        jobs = resolve_jobs(args.jobs, len(plugins) if only is None else max(1, len(only)))
+        scan_workers = resolve_scan_workers(args.scan_workers)
+        prefetch = resolve_prefetch(args.prefetch, jobs)
+        budget = resolve_budget(args.plugin_timeout, args.plugin_cpu, args.plugin_memory)
+        configure_subprocess_timeout(resolve_subprocess_timeout(args.subprocess_timeout))
+    except ValueError as e:
+        fail(str(e))
+
+    ensure_tmp()
+    try:
+        outcomes = validate_outcomes(
+            plugins, jobs, use_cache=not args.no_cache, only=only,
+            scan_workers=scan_workers, prefetch=prefetch, fail_fast=args.fail_fast,
+            record_timings=shard is None, budget=budget
+        )
+    finally:
+        cleanup_tmp()
+
+    if shard:
+        path = Path(args.shard_output or f"validation-shard-{shard[0]}-of-{shard[1]}.json")
+        write_shard_file(path, shard, plugins, plan, {idx: outcomes[idx] for idx in entries})
+        print(f"🧩 Wrote shard results to {path}")
+        outcomes = [outcomes[idx] for idx in sorted(entries)]
+
+    return print_report(*command_index(outcomes))
+
+
 if __name__ == "__main__":
     sys.exit(main())